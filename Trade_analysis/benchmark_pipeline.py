@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from daily_strategies_report import end_of_day_positions
+from lot_ledger import COST_BASIS_METHODS
+from phase1_data_preparation import run_phase1
+from phase2_entry_exit_matching import run_phase2
+from phase3_daily_position_book import run_phase3
+from phase4_strategy_identification import run_phase4, make_detector
+from phase5_mtm_calculation import run_phase5
+from position_timeline import PositionTimeline
+from synthetic_tradebook import generate_tradebook
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def _measure(fn, trace):
+    """(output, seconds, peak bytes allocated above the starting level, or None untraced)."""
+    if trace:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    out = fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - before if trace else None
+    return out, seconds, peak
+
+
+def _position_queries(raw):
+    # What analyze_trades does: build the timeline, then ask for positions at each day's close
+    trades = raw.assign(order_execution_time=pd.to_datetime(raw['order_execution_time']))
+    timeline = PositionTimeline(trades)
+    closes = trades['order_execution_time'].dt.normalize().unique() + pd.Timedelta(hours=23, minutes=59)
+    return [timeline.as_of(close) for close in closes]
+
+
+def run_phases(raw, method='fifo', workers=1, trace=False):
+    """
+    Phases 1-5 and the two report scripts over one raw tradebook, each phase fed the
+    previous one's output. Returns {phase: {seconds, rows_in, rows_out, peak_bytes}};
+    peak_bytes (tracemalloc) is only set when `trace` is on, as tracing slows the run.
+    """
+    results = {}
+
+    def step(name, fn, rows_in, rows_out=len):
+        out, seconds, peak = _measure(fn, trace)
+        results[name] = {'seconds': seconds, 'rows_in': rows_in, 'rows_out': rows_out(out), 'peak_bytes': peak}
+        return out
+
+    trades = step('phase1', lambda: run_phase1(raw), len(raw))
+    _, ledger = step('phase2', lambda: run_phase2(trades, method=method), len(trades), lambda out: len(out[1].lots))
+    _, daily = step('phase3', lambda: run_phase3(ledger.lots), len(ledger.lots), lambda out: len(out[1]))
+    strategies = step('phase4', lambda: run_phase4(daily, make_detector(), workers=workers), len(daily))
+    step('phase5', lambda: run_phase5(ledger.realised_pnl, strategies), len(strategies))
+    step('daily_strategies_report', lambda: end_of_day_positions(raw), len(raw))
+    step('analyze_trades', lambda: _position_queries(raw), len(raw))
+    return results
+
+
+def benchmark(fills, seed=0, method='fifo', workers=1, repeat=1, memory=True):
+    """Time every phase on a synthetic tradebook of `fills` rows: best of `repeat` runs, plus one traced run."""
+    raw, generate_seconds, _ = _measure(lambda: generate_tradebook(fills, seed=seed), False)
+    runs = [run_phases(raw, method, workers) for _ in range(repeat)]
+    phases = {name: dict(runs[0][name], seconds=min(run[name]['seconds'] for run in runs)) for name in runs[0]}
+
+    if memory:
+        tracemalloc.start()
+        try:
+            traced = run_phases(raw, method, workers, trace=True)
+        finally:
+            tracemalloc.stop()
+        for name, stats in traced.items():
+            phases[name]['peak_bytes'] = stats['peak_bytes']
+
+    for stats in phases.values():
+        stats['rows_per_second'] = stats['rows_in'] / stats['seconds'] if stats['seconds'] else None
+    return {'fills': fills, 'generate_seconds': generate_seconds, 'phases': phases}
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """Per-phase time and peak memory of `current` relative to `previous`, for sizes run in both."""
+    rows = []
+    before = {run['fills']: run['phases'] for run in previous['runs']}
+    for run in current['runs']:
+        for name, stats in run['phases'].items():
+            old = before.get(run['fills'], {}).get(name)
+            if old is None:
+                continue
+            rows.append({
+                'fills': run['fills'],
+                'phase': name,
+                'seconds_before': old['seconds'],
+                'seconds_after': stats['seconds'],
+                'time_ratio': stats['seconds'] / old['seconds'] if old['seconds'] else np.nan,
+                'peak_ratio': (stats['peak_bytes'] / old['peak_bytes']
+                               if old.get('peak_bytes') and stats.get('peak_bytes') is not None else np.nan),
+            })
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline phase on synthetic tradebooks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Fills per synthetic tradebook')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--method', choices=COST_BASIS_METHODS, default='fifo')
+    parser.add_argument('--workers', type=int, default=1, help='Processes for phase 4 strategy detection')
+    parser.add_argument('--repeat', type=int, default=1, help='Timed runs per size; the fastest is kept')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced run that measures peak memory')
+    parser.add_argument('--output', default=None, help='JSON results path (default benchmark_pipeline_<commit>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    commit = current_commit()
+    results = {
+        'commit': commit,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'method': args.method,
+        'workers': args.workers,
+        'runs': [],
+    }
+    for fills in args.sizes:
+        run = benchmark(fills, args.seed, args.method, args.workers, args.repeat, memory=not args.no_memory)
+        results['runs'].append(run)
+        print(f"\n{fills} fills (generated in {run['generate_seconds']:.2f}s)")
+        print(pd.DataFrame(run['phases']).T.to_string())
+
+    output = args.output or f"benchmark_pipeline_{commit or 'local'}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nAgainst {args.compare} (commit {previous.get('commit')}); ratios above 1 are slower or larger:")
+        print(compare(previous, results).round(3).to_string(index=False))
@@ -0,0 +1,150 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from strategy_detection import detect_strategies, make_strategy_id
+
+
+# --- Previous nested-loop matcher from phase 4, kept here as the baseline ---
+def legacy_detect_strategies(df):
+    strategies = []
+    for (expiry, underlying), group in df.groupby(['expiry', 'underlying']):
+        group = group.sort_values(['option_type', 'strike'])
+        legs = group.to_dict('records')
+        leg_used = [False] * len(legs)
+
+        for i in range(len(legs)):
+            for j in range(i+1, len(legs)):
+                for k in range(j+1, len(legs)):
+                    for l in range(k+1, len(legs)):
+                        idxs = [i, j, k, l]
+                        if any(leg_used[x] for x in idxs):
+                            continue
+                        subset = [legs[x] for x in idxs]
+                        types = [x['option_type'] for x in subset]
+                        strikes = [x['strike'] for x in subset]
+                        if types.count('CE') == 2 and types.count('PE') == 2 and len(set(strikes)) == 4:
+                            ce_legs = sorted([x for x in subset if x['option_type'] == 'CE'], key=lambda x: x['strike'])
+                            pe_legs = sorted([x for x in subset if x['option_type'] == 'PE'], key=lambda x: x['strike'], reverse=True)
+                            if (ce_legs[0]['quantity'] == -ce_legs[1]['quantity'] and
+                                pe_legs[0]['quantity'] == -pe_legs[1]['quantity']):
+                                strat_legs = [(x['strike'], x['option_type'], x['quantity']) for x in subset]
+                                sid = make_strategy_id(subset[0]['date'], underlying, expiry, 'Iron Condor', strat_legs)
+                                for x in idxs: leg_used[x] = True
+                                strategies.append({'date': subset[0]['date'], 'underlying': underlying, 'expiry': expiry,
+                                                   'strategy_type': 'Iron Condor', 'legs': strat_legs, 'strategy_id': sid})
+
+        for i in range(len(legs)):
+            for j in range(i+1, len(legs)):
+                if leg_used[i] or leg_used[j]:
+                    continue
+                l1, l2 = legs[i], legs[j]
+                if (l1['option_type'] == l2['option_type'] and
+                    l1['strike'] != l2['strike'] and
+                    l1['quantity'] == -l2['quantity']):
+                    if l1['option_type'] == 'CE':
+                        if l1['strike'] < l2['strike'] and l1['quantity'] > 0:
+                            spread_type = 'Bull Call Spread'
+                        elif l1['strike'] > l2['strike'] and l1['quantity'] < 0:
+                            spread_type = 'Bull Call Spread'
+                        else:
+                            spread_type = 'Bear Call Spread'
+                    else:
+                        if l1['strike'] > l2['strike'] and l1['quantity'] > 0:
+                            spread_type = 'Bull Put Spread'
+                        elif l1['strike'] < l2['strike'] and l1['quantity'] < 0:
+                            spread_type = 'Bull Put Spread'
+                        else:
+                            spread_type = 'Bear Put Spread'
+                    strat_legs = [(l1['strike'], l1['option_type'], l1['quantity']),
+                                  (l2['strike'], l2['option_type'], l2['quantity'])]
+                    sid = make_strategy_id(l1['date'], underlying, expiry, spread_type, strat_legs)
+                    leg_used[i] = leg_used[j] = True
+                    strategies.append({'date': l1['date'], 'underlying': underlying, 'expiry': expiry,
+                                       'strategy_type': spread_type, 'legs': strat_legs, 'strategy_id': sid})
+
+        for name, same_strike in (('Straddle', True), ('Strangle', False)):
+            for i in range(len(legs)):
+                for j in range(i+1, len(legs)):
+                    if leg_used[i] or leg_used[j]:
+                        continue
+                    l1, l2 = legs[i], legs[j]
+                    if ((l1['strike'] == l2['strike']) == same_strike and
+                        l1['option_type'] != l2['option_type'] and
+                        l1['quantity'] == l2['quantity']):
+                        strat_legs = [(l1['strike'], l1['option_type'], l1['quantity']),
+                                      (l2['strike'], l2['option_type'], l2['quantity'])]
+                        sid = make_strategy_id(l1['date'], underlying, expiry, name, strat_legs)
+                        leg_used[i] = leg_used[j] = True
+                        strategies.append({'date': l1['date'], 'underlying': underlying, 'expiry': expiry,
+                                           'strategy_type': name, 'legs': strat_legs, 'strategy_id': sid})
+
+        for ix, leg in enumerate(legs):
+            if not leg_used[ix]:
+                strat_legs = [(leg['strike'], leg['option_type'], leg['quantity'])]
+                if leg['option_type'] == 'CE':
+                    single_type = 'Naked Call Buy' if leg['quantity'] > 0 else 'Naked Call Sell'
+                else:
+                    single_type = 'Naked Put Buy' if leg['quantity'] > 0 else 'Naked Put Sell'
+                sid = make_strategy_id(leg['date'], underlying, expiry, single_type, strat_legs)
+                strategies.append({'date': leg['date'], 'underlying': underlying, 'expiry': expiry,
+                                   'strategy_type': single_type, 'legs': strat_legs, 'strategy_id': sid})
+
+    cal_group = df.groupby(['underlying', 'strike', 'option_type', 'quantity'])
+    for (underlying, strike, option_type, quantity), group in cal_group:
+        if group['expiry'].nunique() > 1:
+            exp_list = group['expiry'].unique()
+            strat_legs = [(strike, option_type, quantity, e) for e in exp_list]
+            sid = f"CAL_{underlying}_{strike}_{option_type}_{quantity}_" + "_".join([str(e) for e in exp_list])
+            strategies.append({'date': group['date'].min(), 'underlying': underlying,
+                               'expiry': '|'.join([str(e) for e in exp_list]),
+                               'strategy_type': 'Calendar Spread', 'legs': strat_legs, 'strategy_id': sid})
+    return strategies
+
+
+def synthetic_day(rng, date, legs, expiries=1):
+    """One day of open legs on a single underlying, spread over `expiries` weekly expiries."""
+    expiry_dates = [date + pd.Timedelta(days=7 * (e + 1)) for e in range(expiries)]
+    return pd.DataFrame({
+        'date': date,
+        'underlying': 'NIFTY',
+        'expiry': rng.choice(expiry_dates, size=legs),
+        'strike': rng.choice(np.arange(22000, 24000, 50), size=legs).astype(float),
+        'option_type': rng.choice(['CE', 'PE'], size=legs),
+        'quantity': rng.choice([-75, -50, -25, 25, 50, 75], size=legs),
+    })
+
+
+def run(detector, days):
+    start = time.perf_counter()
+    result = [detector(day) for day in days]
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark phase 4 strategy detection')
+    parser.add_argument('--legs', type=int, default=100, help='Open legs per synthetic day')
+    parser.add_argument('--days', type=int, default=3, help='Synthetic days to time')
+    parser.add_argument('--check-days', type=int, default=500, help='Small random days checked for identical output')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    base = pd.Timestamp('2024-04-01')
+
+    # Identical output on many small days, where the legacy matcher is cheap
+    for d in range(args.check_days):
+        day = synthetic_day(rng, base + pd.Timedelta(days=d), int(rng.integers(1, 16)), int(rng.integers(1, 3)))
+        assert detect_strategies(day) == legacy_detect_strategies(day), f"Mismatch on check day {d}"
+    print(f"Output identical on {args.check_days} random days")
+
+    days = [synthetic_day(rng, base + pd.Timedelta(days=d), args.legs) for d in range(args.days)]
+    legacy, legacy_secs = run(legacy_detect_strategies, days)
+    indexed, indexed_secs = run(detect_strategies, days)
+    assert legacy == indexed, "Mismatch on benchmark days"
+
+    print(f"{args.days} days x {args.legs} legs")
+    print(f"Nested loops : {legacy_secs:.3f}s")
+    print(f"Hash indexed : {indexed_secs:.3f}s")
+    print(f"Speedup      : {legacy_secs / indexed_secs:.1f}x")
@@ -0,0 +1,101 @@
+import argparse
+import re
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from symbol_parser import parse_symbols, clear_symbol_cache, PARSED_COLUMNS
+
+
+# --- Previous row-wise path from phase 1, kept here as the baseline ---
+def legacy_parse_symbol(symbol):
+    m_monthly = re.match(r'^([A-Z]+)(\d{2})(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)(\d+)(CE|PE)$', symbol)
+    m_weekly = re.match(r'^([A-Z]+)(\d{2})(\d|O|N|D)(\d{2})(\d+)(CE|PE)$', symbol)
+
+    month_map = {'JAN':1, 'FEB':2, 'MAR':3, 'APR':4, 'MAY':5, 'JUN':6,
+                 'JUL':7, 'AUG':8, 'SEP':9, 'OCT':10, 'NOV':11, 'DEC':12,
+                 'O':10, 'N':11, 'D':12}
+
+    if m_monthly:
+        underlying = m_monthly.group(1)
+        year = 2000 + int(m_monthly.group(2))
+        month = month_map[m_monthly.group(3)]
+        strike = int(m_monthly.group(4))
+        option_type = m_monthly.group(5)
+        return underlying, year, month, np.nan, strike, option_type, None
+
+    elif m_weekly:
+        underlying = m_weekly.group(1)
+        year = 2000 + int(m_weekly.group(2))
+        month_code = m_weekly.group(3)
+        day = int(m_weekly.group(4))
+        month = month_map[month_code] if month_code in month_map else int(month_code)
+        strike = int(m_weekly.group(5))
+        option_type = m_weekly.group(6)
+        try:
+            expiry_date = datetime(year, month, day)
+        except:
+            expiry_date = None
+        return underlying, year, month, day, strike, option_type, expiry_date
+
+    return np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, None
+
+
+def legacy_calculate_expiry(row):
+    try:
+        return datetime(row['expiry_year'], row['expiry_month'], 1) + pd.offsets.MonthEnd(0)
+    except:
+        return row['expiry_date']
+
+
+def legacy_path(trades):
+    parsed = trades['symbol'].apply(legacy_parse_symbol)
+    out = pd.DataFrame(parsed.tolist(), index=trades.index, columns=PARSED_COLUMNS)
+    out['expiry_date'] = trades['expiry_date'].combine_first(pd.to_datetime(out['parsed_expiry_date']))
+    out['expiry_date'] = out.join(trades[['symbol']]).apply(legacy_calculate_expiry, axis=1)
+    return out
+
+
+def vectorized_path(trades):
+    out = parse_symbols(trades['symbol'])
+    out['expiry_date'] = trades['expiry_date'].combine_first(out['parsed_expiry_date'])
+    return out
+
+
+def load_trades(file_path, rows):
+    sample = pd.read_csv(file_path)
+    sample['expiry_date'] = pd.to_datetime(sample['expiry_date'], format='%d-%m-%Y', errors='coerce')
+    reps = int(np.ceil(rows / len(sample)))
+    return pd.concat([sample[['symbol', 'expiry_date']]] * reps, ignore_index=True).iloc[:rows]
+
+
+def timed(fn, trades):
+    start = time.perf_counter()
+    out = fn(trades)
+    return out, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark phase 1 symbol parsing')
+    parser.add_argument('--file', default='tradebook-KG2302-FO-last-FY.csv')
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    trades = load_trades(args.file, args.rows)
+    legacy, legacy_secs = timed(legacy_path, trades)
+    clear_symbol_cache()
+    vectorized, vectorized_secs = timed(vectorized_path, trades)
+
+    check_cols = ['underlying', 'expiry_year', 'expiry_month', 'expiry_day', 'strike', 'option_type', 'expiry_date']
+    pd.testing.assert_frame_equal(
+        legacy[check_cols].astype(object).where(legacy[check_cols].notna(), None),
+        vectorized[check_cols].astype(object).where(vectorized[check_cols].notna(), None),
+        check_dtype=False
+    )
+
+    print(f"Rows: {len(trades)} ({trades['symbol'].nunique()} distinct symbols)")
+    print(f"Row-wise apply : {legacy_secs:.3f}s")
+    print(f"Vectorized     : {vectorized_secs:.3f}s")
+    print(f"Speedup        : {legacy_secs / vectorized_secs:.1f}x")
@@ -0,0 +1,114 @@
+import numpy as np
+
+# Annualised risk-free rate used for Indian index options
+RISK_FREE_RATE = 0.065
+MIN_VOL, MAX_VOL = 1e-4, 5.0
+
+
+def _norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def ndtr(x):
+    """Standard normal CDF (Abramowitz and Stegun 26.2.17, absolute error below 7.5e-8)."""
+    z = np.abs(x)
+    k = 1.0 / (1.0 + 0.2316419 * z)
+    poly = k * (0.319381530 + k * (-0.356563782 + k * (1.781477937 + k * (-1.821255978 + k * 1.330274429))))
+    tail = _norm_pdf(z) * poly
+    return np.where(x >= 0, 1.0 - tail, tail)
+
+
+def _d1_d2(spot, strike, t, vol, rate):
+    sqrt_t = np.sqrt(t)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * t) / (vol * sqrt_t)
+    return d1, d1 - vol * sqrt_t
+
+
+def _price_vega(spot, strike, t, vol, is_call, rate):
+    # Price and vega (per unit of vol) of live options from one d1, for the IV solver
+    d1, d2 = _d1_d2(spot, strike, t, vol, rate)
+    discount = strike * np.exp(-rate * t)
+    call = spot * ndtr(d1) - discount * ndtr(d2)
+    # Put-call parity: P = C - S + K e^(-rT)
+    return np.where(is_call, call, call - spot + discount), spot * _norm_pdf(d1) * np.sqrt(t)
+
+
+def price(spot, strike, t, vol, is_call, rate=RISK_FREE_RATE):
+    """Black-Scholes prices of European options, broadcast over all arguments; `t` in years."""
+    spot, strike, t, vol = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (spot, strike, t, vol)))
+    is_call = np.broadcast_to(is_call, spot.shape)
+    intrinsic = np.where(is_call, np.maximum(spot - strike, 0.0), np.maximum(strike - spot, 0.0))
+    live = (t > 0) & (vol > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1, d2 = _d1_d2(spot, strike, t, vol, rate)
+        discount = strike * np.exp(-rate * t)
+        call = spot * ndtr(d1) - discount * ndtr(d2)
+        # Put-call parity: P = C - S + K e^(-rT)
+        value = np.where(is_call, call, call - spot + discount)
+    return np.where(live, value, intrinsic)
+
+
+def greeks(spot, strike, t, vol, is_call, rate=RISK_FREE_RATE):
+    """
+    Per-unit delta, gamma, theta (per calendar day) and vega (per vol point) as a dict
+    of arrays. Options at or past expiry (t <= 0) or without a vol get NaN.
+    """
+    spot, strike, t, vol = (np.asarray(a, dtype=float) for a in (spot, strike, t, vol))
+    live = (t > 0) & (vol > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1, d2 = _d1_d2(spot, strike, t, vol, rate)
+        pdf = _norm_pdf(d1)
+        sqrt_t = np.sqrt(t)
+        discount = np.exp(-rate * t)
+        delta = np.where(is_call, ndtr(d1), ndtr(d1) - 1.0)
+        gamma = pdf / (spot * vol * sqrt_t)
+        decay = -spot * pdf * vol / (2 * sqrt_t)
+        theta = np.where(is_call, decay - rate * strike * discount * ndtr(d2),
+                         decay + rate * strike * discount * ndtr(-d2)) / 365.0
+        vega = spot * pdf * sqrt_t / 100.0
+    return {name: np.where(live, value, np.nan)
+            for name, value in (('delta', delta), ('gamma', gamma), ('theta', theta), ('vega', vega))}
+
+
+def implied_vol(option_price, spot, strike, t, is_call, rate=RISK_FREE_RATE, iterations=50, tol=1e-6):
+    """
+    Implied volatility of every option at once: Newton steps on vega kept inside a
+    shrinking [MIN_VOL, MAX_VOL] bracket, falling back to bisection where a step
+    leaves it. Prices with no time value (at or below the lower no-arbitrage bound,
+    e.g. deep in-the-money or worthless) get MIN_VOL, so their greeks take the
+    zero-vol limit; prices above the upper bound, or at expiry, give NaN.
+    """
+    option_price, spot, strike, t = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (option_price, spot, strike, t)))
+    is_call = np.broadcast_to(is_call, spot.shape)
+    discount = strike * np.exp(-rate * np.maximum(t, 0))
+    lower = np.where(is_call, np.maximum(spot - discount, 0.0), np.maximum(discount - spot, 0.0))
+    upper = np.where(is_call, spot, discount)
+    live = (t > 0) & np.isfinite(spot) & np.isfinite(option_price) & (option_price < upper)
+    solvable = live & (option_price > lower)
+
+    lo = np.full(spot.shape, MIN_VOL)
+    hi = np.full(spot.shape, MAX_VOL)
+    # Brenner-Subrahmanyam start, close for near-the-money options
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol = np.clip(np.sqrt(2 * np.pi / np.where(t > 0, t, 1.0)) * option_price / spot, 0.05, 2.0)
+    vol = np.where(solvable, vol, np.where(live, MIN_VOL, np.nan))
+
+    active = solvable.copy()
+    for _ in range(iterations):
+        if not active.any():
+            break
+        idx = np.flatnonzero(active)
+        v, target = vol[idx], option_price[idx]
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            model, vega = _price_vega(spot[idx], strike[idx], t[idx], v, is_call[idx], rate)
+            diff = model - target
+            step = v - diff / vega
+        too_high = diff > 0
+        hi[idx] = np.where(too_high, v, hi[idx])
+        lo[idx] = np.where(too_high, lo[idx], v)
+        inside = np.isfinite(step) & (step > lo[idx]) & (step < hi[idx])
+        converged = np.abs(diff) <= tol * np.maximum(target, 1.0)
+        vol[idx] = np.where(converged, v, np.where(inside, step, 0.5 * (lo[idx] + hi[idx])))
+        active[idx] = ~converged
+    return vol
@@ -0,0 +1,174 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from expiry_calendar import CACHE_DIR
+
+CANDLE_DIR = os.path.join(CACHE_DIR, 'candles')
+CANDLE_COLUMNS = ['symbol', 'date', 'open', 'high', 'low', 'close', 'volume', 'oi']
+
+# Kite allows about three historical-data requests a second
+FETCH_INTERVAL = 0.35
+
+
+class CandleCache:
+    """
+    Daily option candles on disk, one CSV per trading symbol under `cache_dir`.
+
+    Candles are added with `store` (from `fetch`, which goes through a
+    ZerodhaService, or `import_files`), merged with what is cached and deduplicated
+    by date, so refreshing a symbol only rewrites that symbol. `load` returns every
+    cached candle as one frame for vectorized joins.
+    """
+
+    def __init__(self, cache_dir=CANDLE_DIR):
+        self.cache_dir = cache_dir
+
+    def path(self, symbol):
+        return os.path.join(self.cache_dir, f'{symbol}.csv')
+
+    def symbols(self):
+        return sorted(os.path.splitext(os.path.basename(path))[0]
+                      for path in glob.glob(os.path.join(self.cache_dir, '*.csv')))
+
+    def load(self, symbols=None):
+        """Cached candles of `symbols` (all by default) in CANDLE_COLUMNS, sorted by symbol and date."""
+        symbols = self.symbols() if symbols is None else [s for s in dict.fromkeys(symbols)
+                                                          if os.path.exists(self.path(s))]
+        frames = [pd.read_csv(self.path(symbol), parse_dates=['date']) for symbol in symbols]
+        if not frames:
+            return pd.DataFrame({col: pd.Series(dtype='datetime64[ns]' if col == 'date' else float)
+                                 for col in CANDLE_COLUMNS}).astype({'symbol': object})
+        return pd.concat(frames, ignore_index=True)[CANDLE_COLUMNS]
+
+    def store(self, candles):
+        """Merge `candles` (symbol, date and OHLC columns) into the cache; returns the symbols written."""
+        candles = _normalize(candles)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for symbol, new in candles.groupby('symbol', sort=False):
+            path = self.path(symbol)
+            if os.path.exists(path):
+                new = pd.concat([pd.read_csv(path, parse_dates=['date']), new], ignore_index=True)
+            new = new.drop_duplicates('date', keep='last').sort_values('date')
+            new[CANDLE_COLUMNS].to_csv(path, index=False)
+        return list(candles['symbol'].unique())
+
+    def coverage(self):
+        """First and last cached date per symbol."""
+        candles = self.load()
+        return candles.groupby('symbol')['date'].agg(first='min', last='max')
+
+    def missing(self, contracts):
+        """
+        Rows of `contracts` (symbol, start, end) whose date range is not inside the
+        cached range of their symbol; the part still to fetch starts after the last
+        cached day.
+        """
+        contracts = contracts.join(self.coverage(), on='symbol')
+        need = contracts['first'].isna() | (contracts['first'] > contracts['start']) | \
+            (contracts['last'] < contracts['end'])
+        contracts = contracts[need].copy()
+        resume = contracts['first'].notna() & (contracts['first'] <= contracts['start'])
+        contracts.loc[resume, 'start'] = contracts.loc[resume, 'last'] + pd.Timedelta(days=1)
+        return contracts[['symbol', 'start', 'end']].reset_index(drop=True)
+
+    def import_files(self, paths):
+        """
+        Store candle files. A file needs date and close columns (open, high, low, volume
+        and oi are optional) and either a symbol column or the symbol as its file name.
+        Returns the number of candles imported.
+        """
+        rows = 0
+        for path in paths:
+            candles = pd.read_csv(path)
+            candles.columns = [col.strip().lower() for col in candles.columns]
+            if 'symbol' not in candles:
+                candles['symbol'] = os.path.splitext(os.path.basename(path))[0]
+            self.store(candles)
+            rows += len(candles)
+        return rows
+
+    def fetch(self, service, contracts, exchange='NFO', pause=FETCH_INTERVAL):
+        """
+        Download the daily candles `missing` from `contracts` (symbol, start, end) with
+        `service.get_historical_data`, resolving instrument tokens from
+        `service.get_instruments(exchange)`. Kite only lists live contracts, so expired
+        symbols come back as unavailable and have to be imported from files.
+        Returns (symbols fetched, symbols unavailable).
+        """
+        todo = self.missing(contracts)
+        if todo.empty:
+            return [], []
+        tokens = {row['tradingsymbol']: row['instrument_token'] for row in service.get_instruments(exchange)}
+        fetched, unavailable = [], []
+        for symbol, start, end in todo.itertuples(index=False):
+            token = tokens.get(symbol)
+            if token is None:
+                unavailable.append(symbol)
+                continue
+            candles = service.get_historical_data(token, start.to_pydatetime(), end.to_pydatetime(), 'day')
+            candles = pd.DataFrame(candles)
+            if not candles.empty:
+                self.store(candles.assign(symbol=symbol))
+                fetched.append(symbol)
+            time.sleep(pause)
+        return fetched, unavailable
+
+
+def _normalize(candles):
+    candles = candles.copy()
+    # Kite returns timezone-aware candle timestamps; the book works in naive dates
+    dates = pd.to_datetime(candles['date'])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    candles['date'] = dates.dt.normalize()
+    for col in CANDLE_COLUMNS:
+        if col not in candles:
+            candles[col] = np.nan
+    candles = candles.dropna(subset=['symbol', 'date', 'close'])
+    return candles[CANDLE_COLUMNS]
+
+
+def lot_contracts(lots):
+    """
+    Symbols of the Phase 2 lots with the dates they need prices for: from the first
+    open to the last day a lot is held (its final close, else expiry), up to today.
+    """
+    expiry = pd.to_datetime(lots['expiry'])
+    closed = lots['remaining_qty'] == 0
+    held_until = pd.to_datetime(lots['close_date']).where(closed, expiry).fillna(expiry)
+    contracts = pd.DataFrame({'symbol': lots['symbol'], 'start': pd.to_datetime(lots['open_date']),
+                              'end': held_until.clip(upper=pd.Timestamp.today().normalize())})
+    return contracts.groupby('symbol').agg(start=('start', 'min'), end=('end', 'max')).reset_index()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Populate the daily option candle cache')
+    parser.add_argument('--cache-dir', default=CANDLE_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    files = sub.add_parser('import', help='Import candle CSV files')
+    files.add_argument('paths', nargs='+')
+    kite = sub.add_parser('fetch', help='Fetch candles for the lots in a Phase 2 lot ledger from Zerodha')
+    kite.add_argument('--lots', default='phase2_lot_ledger.csv')
+    kite.add_argument('--access-token', default=os.getenv('ZERODHA_ACCESS_TOKEN'),
+                      help='Kite access token (default $ZERODHA_ACCESS_TOKEN)')
+    args = parser.parse_args()
+
+    cache = CandleCache(args.cache_dir)
+    if args.command == 'import':
+        print(f"Imported {cache.import_files(args.paths)} candles; {len(cache.symbols())} symbols cached")
+    else:
+        if not args.access_token:
+            parser.error('fetch needs --access-token or ZERODHA_ACCESS_TOKEN')
+        import sys
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from app.services.zerodha_service import ZerodhaService
+
+        service = ZerodhaService()
+        service.set_access_token(args.access_token)
+        fetched, unavailable = cache.fetch(service, lot_contracts(pd.read_csv(args.lots)))
+        print(f"Fetched {len(fetched)} symbols; {len(unavailable)} not listed on Kite (import them from files)")
@@ -0,0 +1,143 @@
+import argparse
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+CHARGE_COMPONENTS = ['brokerage', 'stt', 'exchange_txn', 'sebi_fee', 'stamp_duty', 'gst']
+RATE_FIELDS = ['brokerage_per_order', 'brokerage_pct', 'stt_sell', 'exchange_txn', 'sebi_fee', 'stamp_duty_buy',
+               'gst']
+
+# (exchange, instrument, valid_from, valid_to, brokerage_per_order, brokerage_pct, stt_sell, exchange_txn,
+#  sebi_fee, stamp_duty_buy, gst) - rates are fractions of turnover (premium turnover for options).
+# Brokerage is the smaller of the flat fee and brokerage_pct of an order's turnover (flat when NaN);
+# STT is charged on sells, stamp duty on buys, and GST on brokerage, exchange charges and SEBI fees.
+CHARGE_RATES = [
+    ('NSE', 'option', '2023-04-01', '2024-09-30', 20.0, np.nan, 0.000625, 0.00053, 0.000001, 0.00003, 0.18),
+    ('NSE', 'option', '2024-10-01', None, 20.0, np.nan, 0.001, 0.0003503, 0.000001, 0.00003, 0.18),
+    ('NSE', 'future', '2023-04-01', '2024-09-30', 20.0, 0.0003, 0.000125, 0.00002, 0.000001, 0.00002, 0.18),
+    ('NSE', 'future', '2024-10-01', None, 20.0, 0.0003, 0.0002, 0.0000173, 0.000001, 0.00002, 0.18),
+]
+
+# Changes whenever a rate does, so charges computed under an old table can be told apart
+RATES_VERSION = hashlib.sha1(repr(CHARGE_RATES).encode()).hexdigest()[:8]
+
+# Weeks end on Friday, the last trading day
+WEEK = 'W-FRI'
+
+
+def rate_table(rates=CHARGE_RATES):
+    table = pd.DataFrame(rates, columns=['exchange', 'instrument', 'valid_from', 'valid_to'] + RATE_FIELDS)
+    table['valid_from'] = pd.to_datetime(table['valid_from'])
+    table['valid_to'] = pd.to_datetime(table['valid_to']).fillna(pd.Timestamp.max.normalize())
+    return table.sort_values(['exchange', 'instrument', 'valid_from']).reset_index(drop=True)
+
+
+def _per_distinct(values, normalize):
+    # Apply a string normalization once per distinct value of a tradebook column
+    codes, uniques = pd.factorize(values)
+    normalized = np.asarray(normalize(pd.Series(uniques, dtype=object).astype(str).str.strip()), dtype=object)
+    return normalized[codes] if len(codes) else np.array([], dtype=object)
+
+
+def _instrument(symbols):
+    # Options end in CE/PE and futures in FUT
+    suffix = symbols.str.upper().str[-3:]
+    return np.select([suffix.str[-2:].isin(['CE', 'PE']).to_numpy(), (suffix == 'FUT').to_numpy()],
+                     ['option', 'future'], default='other')
+
+
+def _dates(values):
+    # Tradebook dates are dd-mm-yyyy strings; parse each distinct one
+    codes, uniques = pd.factorize(values)
+    return pd.to_datetime(pd.Series(uniques), format='%d-%m-%Y', errors='coerce').to_numpy()[codes]
+
+
+def fill_charges(trades, rates=CHARGE_RATES):
+    """
+    Statutory charges of every fill of a raw tradebook, as columns: trade_date (parsed),
+    turnover, each of CHARGE_COMPONENTS and total_charges.
+
+    Each fill takes the rates of its exchange and instrument in force on its trade
+    date. Brokerage is charged per order and spread over the order's fills by
+    turnover. Fills without a rate (another exchange, an instrument that is not an
+    option or future, or a date before the table) get NaN charges.
+    """
+    trades = trades.rename(columns=lambda col: col.strip().lower(), copy=False)
+    dates = trades['trade_date'] if pd.api.types.is_datetime64_any_dtype(trades['trade_date']) \
+        else _dates(trades['trade_date'])
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    instruments = _per_distinct(trades['symbol'], _instrument)
+    exchanges = _per_distinct(trades['exchange'], lambda s: s.str.upper())
+    turnover = trades['quantity'].to_numpy(dtype=float) * trades['price'].to_numpy(dtype=float)
+    is_sell = _per_distinct(trades['trade_type'], lambda s: s.str.lower()) == 'sell'
+
+    # Rate version of every fill: the last valid_from on or before its date, if still in force
+    table = rate_table(rates)
+    version = np.full(len(trades), -1)
+    for (exchange, instrument), versions in table.groupby(['exchange', 'instrument']):
+        mask = (exchanges == exchange) & (instruments == instrument)
+        starts = versions['valid_from'].to_numpy()
+        pos = np.searchsorted(starts, dates[mask], side='right') - 1
+        found = pos >= 0
+        idx = versions.index.to_numpy()[np.maximum(pos, 0)]
+        in_force = found & (dates[mask] <= table['valid_to'].to_numpy()[idx])
+        version[np.flatnonzero(mask)[in_force]] = idx[in_force]
+    priced = version >= 0
+    rate = {field: np.where(priced, table[field].to_numpy()[np.maximum(version, 0)], np.nan) for field in RATE_FIELDS}
+
+    # Brokerage per order, spread over its fills by turnover
+    order_codes, _ = pd.factorize(trades['order_id'])
+    order_turnover = np.bincount(order_codes, weights=turnover)
+    fee = np.where(np.isnan(rate['brokerage_pct']), rate['brokerage_per_order'],
+                   np.minimum(rate['brokerage_per_order'], rate['brokerage_pct'] * order_turnover[order_codes]))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = np.where(order_turnover[order_codes] > 0, turnover / order_turnover[order_codes],
+                         1.0 / np.bincount(order_codes)[order_codes])
+
+    charges = pd.DataFrame({
+        'trade_date': dates,
+        'turnover': turnover,
+        'brokerage': fee * share,
+        'stt': np.where(is_sell, turnover * rate['stt_sell'], 0.0),
+        'exchange_txn': turnover * rate['exchange_txn'],
+        'sebi_fee': turnover * rate['sebi_fee'],
+        'stamp_duty': np.where(is_sell, 0.0, turnover * rate['stamp_duty_buy']),
+    }, index=trades.index)
+    charges['stt'] = charges['stt'].where(priced)
+    charges['stamp_duty'] = charges['stamp_duty'].where(priced)
+    charges['gst'] = (charges['brokerage'] + charges['exchange_txn'] + charges['sebi_fee']) * rate['gst']
+    charges['total_charges'] = charges[CHARGE_COMPONENTS].sum(axis=1, min_count=len(CHARGE_COMPONENTS))
+    return charges
+
+
+def period_charges(charges, freq=WEEK):
+    """
+    `fill_charges` summed per period (weekly by default, labelled by the period's last
+    day), with the number of fills and of fills left without a rate.
+    """
+    frame = charges.assign(fills=1, unpriced_fills=charges['total_charges'].isna())
+    totals = frame.groupby(pd.Grouper(key='trade_date', freq=freq))[
+        ['fills', 'unpriced_fills', 'turnover'] + CHARGE_COMPONENTS + ['total_charges']].sum()
+    return totals[totals['fills'] > 0].round(2).rename_axis('date').reset_index()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Statutory charges of every fill in a tradebook, and weekly totals')
+    parser.add_argument('tradebook', nargs='?', default='tradebook-KG2302-FO-last-FY.csv')
+    parser.add_argument('--freq', default=WEEK, help='pandas period of the totals (default weekly, ending Friday)')
+    parser.add_argument('--output', default='charges_weekly.csv')
+    parser.add_argument('--fills-output', default=None, help='Also save the charges of every fill here')
+    args = parser.parse_args()
+
+    trades = pd.read_csv(args.tradebook)
+    charges = fill_charges(trades)
+    totals = period_charges(charges, args.freq)
+    totals.to_csv(args.output, index=False)
+    if args.fills_output:
+        pd.concat([trades, charges.drop(columns='trade_date')], axis=1).to_csv(args.fills_output, index=False)
+
+    unpriced = int(charges['total_charges'].isna().sum())
+    print(f"Charges of {len(trades)} fills under rate table {RATES_VERSION}; {unpriced} fills without a rate")
+    print(charges[CHARGE_COMPONENTS + ['total_charges']].sum().round(2).to_string())
+    print(f"{len(totals)} periods saved to {args.output}")
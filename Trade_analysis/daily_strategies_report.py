@@ -1,67 +1,102 @@
+import numpy as np
 import pandas as pd
-from collections import deque, defaultdict
-
-# Load the CSV file into a DataFrame
-file_path = 'tradebook-KG2302-FO(last FY).csv'
-df = pd.read_csv(file_path)
-
-# Ensure order_execution_time is datetime
-if not pd.api.types.is_datetime64_any_dtype(df['order_execution_time']):
-    df['order_execution_time'] = pd.to_datetime(df['order_execution_time'])
-
-# Sort by execution time
-trades = df.sort_values('order_execution_time')
-
-# Position queue per symbol
-position_queues = defaultdict(deque)
-# Track daily snapshots
-end_of_day_positions = {}
-
-# Get all unique trade dates (as date, not datetime)
-trades['trade_date_only'] = trades['order_execution_time'].dt.date
-unique_dates = sorted(trades['trade_date_only'].unique())
-
-# Process trades FIFO and take snapshot at end of each day
-day_idx = 0
-for idx, row in trades.iterrows():
-    symbol = row['symbol']
-    qty = int(row['quantity'])
-    trade_type = row['trade_type'].lower()
-    exec_time = row['order_execution_time']
-    price = row['price']
-    # FIFO logic
-    if trade_type == 'buy':
-        position_queues[symbol].append({'quantity': qty, 'price': price, 'execution_time': exec_time})
-    elif trade_type == 'sell':
-        qty_to_close = qty
-        while qty_to_close > 0 and position_queues[symbol]:
-            pos = position_queues[symbol][0]
-            if pos['quantity'] > qty_to_close:
-                pos['quantity'] -= qty_to_close
-                qty_to_close = 0
-            else:
-                qty_to_close -= pos['quantity']
-                position_queues[symbol].popleft()
-    # If this is the last trade of the day, save snapshot
-    next_idx = idx + 1
-    is_last_trade_today = (next_idx == len(trades)) or (trades.iloc[next_idx]['trade_date_only'] != row['trade_date_only'])
-    if is_last_trade_today:
-        # Save a copy of all open positions at end of this day
-        snapshot = {s: list(q) for s, q in position_queues.items() if q}
-        end_of_day_positions[row['trade_date_only']] = snapshot
-
-# Print active strategies at end of each day
-def describe_strategy(positions):
-    """Describe the options strategy based on open positions."""
-    if not positions:
-        return 'No open positions'
-    legs = []
-    for symbol, pos_list in positions.items():
-        for pos in pos_list:
-            legs.append(f"{symbol}: {pos['quantity']} @ {pos['price']} (opened {pos['execution_time'].date()})")
-    return '\n'.join(legs)
-
-print("Active option strategies at end of each day in last financial year:")
-for day, positions in end_of_day_positions.items():
-    print(f"\nDate: {day}")
-    print(describe_strategy(positions))
+
+from position_timeline import symbol_expiries
+
+REPORT_COLUMNS = ['date', 'symbol', 'open_qty', 'avg_price', 'open_cost']
+
+
+def end_of_day_positions(trades):
+    """
+    Open FIFO positions per symbol at the end of every trading day, one row per
+    (date, symbol) with open_qty > 0, sorted by date and symbol.
+
+    Buys open lots and sells close the oldest ones; a sell beyond what is open is
+    ignored. That makes the open quantity a running sum of signed quantities floored
+    at zero: C - min(0, running min of C). The cost still open is everything bought
+    minus the cost of the first (bought - open) units, found with one searchsorted
+    over cumulative buy quantities. End-of-day rows are carried forward to days on
+    which a symbol did not trade, up to its expiry day: a contract is settled at
+    expiry and left out after it, the same rule as position_timeline.
+    """
+    trades = trades.sort_values('order_execution_time', kind='stable')
+    times = pd.to_datetime(trades['order_execution_time'])
+    side = trades['trade_type'].str.lower().to_numpy()
+    buy, sell = side == 'buy', side == 'sell'
+    qty = trades['quantity'].to_numpy(dtype=np.int64)
+    price = trades['price'].to_numpy(dtype=float)
+    codes, symbols = pd.factorize(trades['symbol'])
+
+    delta = np.where(buy, qty, np.where(sell, -qty, 0))
+    buy_qty = np.where(buy, qty, 0)
+    buy_cost = buy_qty * price
+    by_symbol = pd.DataFrame({'code': codes, 'delta': delta, 'buy_qty': buy_qty, 'buy_cost': buy_cost}) \
+        .groupby('code')
+    running = by_symbol['delta'].cumsum().to_numpy()
+    floor = np.minimum(pd.Series(running).groupby(codes).cummin().to_numpy(), 0)
+    open_qty = running - floor
+    bought = by_symbol['buy_qty'].cumsum().to_numpy()
+    spent = by_symbol['buy_cost'].cumsum().to_numpy()
+    closed = bought - open_qty
+
+    # Cost of the first `closed` units bought, per symbol: locate the buy that is
+    # partly open in each symbol's cumulative buy quantities (keys offset by symbol)
+    buys = np.flatnonzero(buy)
+    buys = buys[np.argsort(codes[buys], kind='stable')]
+    span = int(bought.max(initial=0)) + 1
+    keys = codes[buys] * span + bought[buys]
+    partly_open = np.minimum(np.searchsorted(keys, codes * span + closed, side='right'), max(len(buys) - 1, 0))
+    if len(buys):
+        head = buys[partly_open]
+        closed_cost = (spent[head] - buy_cost[head]) + (closed - (bought[head] - buy_qty[head])) * price[head]
+    else:
+        closed_cost = np.zeros(len(trades))
+    open_cost = np.where(closed >= bought, 0.0, spent - closed_cost)
+
+    # Last trade of each (day, symbol), then carried forward over trading days
+    eod = pd.DataFrame({
+        'date': times.dt.normalize().to_numpy(),
+        'code': codes,
+        'open_qty': open_qty,
+        'open_cost': open_cost,
+    }).drop_duplicates(['date', 'code'], keep='last')
+    days = pd.DatetimeIndex(eod['date'].unique())
+    wide = eod.pivot(index='date', columns='code', values=['open_qty', 'open_cost']).reindex(days).ffill()
+    report = wide.stack(future_stack=True).dropna().reset_index()
+    report.columns = ['date', 'code', 'open_qty', 'open_cost']
+    report = report[report['open_qty'] > 0]
+    expiry = symbol_expiries(trades, symbols)[report['code'].to_numpy()]
+    report = report[np.isnat(expiry) | (report['date'].to_numpy() <= expiry)]
+
+    report = pd.DataFrame({
+        'date': report['date'].to_numpy(),
+        'symbol': symbols[report['code'].to_numpy()],
+        'open_qty': report['open_qty'].astype(np.int64).to_numpy(),
+        'avg_price': (report['open_cost'] / report['open_qty']).to_numpy(),
+        'open_cost': report['open_cost'].to_numpy(),
+    })
+    return report.sort_values(['date', 'symbol']).reset_index(drop=True)[REPORT_COLUMNS]
+
+
+def report_records(report):
+    """JSON-ready report: [{'date': 'YYYY-MM-DD', 'positions': [{symbol, open_qty, avg_price, open_cost}]}]."""
+    report = report.assign(date=report['date'].dt.strftime('%Y-%m-%d'), avg_price=report['avg_price'].round(2),
+                           open_cost=report['open_cost'].round(2))
+    return [{'date': date, 'positions': day.drop(columns='date').to_dict('records')}
+            for date, day in report.groupby('date', sort=True)]
+
+
+if __name__ == '__main__':
+    import json
+
+    # Load the CSV file into a DataFrame
+    file_path = 'tradebook-KG2302-FO-last-FY.csv'
+    df = pd.read_csv(file_path)
+
+    report = end_of_day_positions(df)
+    report.to_csv('daily_positions_report.csv', index=False)
+    with open('daily_positions_report.json', 'w') as f:
+        json.dump(report_records(report), f, indent=2)
+
+    print(f"End-of-day positions: {len(report)} rows over {report['date'].nunique()} trading days. Sample:")
+    print(report.head(10))
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+# Underlyings without their own rules fall back to the stock-option schedule
+DEFAULT_UNDERLYING = '*'
+
+# (underlying, kind, weekday, valid_from, valid_to) - monthly rules expire on the
+# last such weekday of the month, weekly rules on every such weekday.
+EXPIRY_RULES = [
+    ('NIFTY', 'weekly', 'THU', '2019-02-11', '2025-08-31'),
+    ('NIFTY', 'weekly', 'TUE', '2025-09-01', None),
+    ('NIFTY', 'monthly', 'THU', '2000-01-01', '2025-08-31'),
+    ('NIFTY', 'monthly', 'TUE', '2025-09-01', None),
+    ('BANKNIFTY', 'weekly', 'THU', '2016-05-27', '2023-09-05'),
+    ('BANKNIFTY', 'weekly', 'WED', '2023-09-06', '2024-11-13'),
+    ('BANKNIFTY', 'monthly', 'THU', '2000-01-01', '2024-02-29'),
+    ('BANKNIFTY', 'monthly', 'WED', '2024-03-01', '2024-12-31'),
+    ('BANKNIFTY', 'monthly', 'THU', '2025-01-01', '2025-08-31'),
+    ('BANKNIFTY', 'monthly', 'TUE', '2025-09-01', None),
+    ('FINNIFTY', 'weekly', 'TUE', '2021-01-11', '2024-11-19'),
+    ('FINNIFTY', 'monthly', 'TUE', '2021-01-01', '2024-12-31'),
+    ('FINNIFTY', 'monthly', 'THU', '2025-01-01', '2025-08-31'),
+    ('FINNIFTY', 'monthly', 'TUE', '2025-09-01', None),
+    ('MIDCPNIFTY', 'weekly', 'MON', '2023-07-24', '2024-11-18'),
+    ('MIDCPNIFTY', 'monthly', 'MON', '2023-07-01', '2024-12-31'),
+    ('MIDCPNIFTY', 'monthly', 'THU', '2025-01-01', '2025-08-31'),
+    ('MIDCPNIFTY', 'monthly', 'TUE', '2025-09-01', None),
+    (DEFAULT_UNDERLYING, 'monthly', 'THU', '2000-01-01', '2025-08-31'),
+    (DEFAULT_UNDERLYING, 'monthly', 'TUE', '2025-09-01', None),
+]
+
+# NSE F&O trading holidays; an expiry falling on one moves to the previous trading day
+NSE_HOLIDAYS = [
+    '2023-01-26', '2023-03-07', '2023-03-30', '2023-04-04', '2023-04-07', '2023-04-14',
+    '2023-05-01', '2023-06-29', '2023-08-15', '2023-09-19', '2023-10-02', '2023-10-24',
+    '2023-11-14', '2023-11-27', '2023-12-25',
+    '2024-01-22', '2024-01-26', '2024-03-08', '2024-03-25', '2024-03-29', '2024-04-11',
+    '2024-04-17', '2024-05-01', '2024-05-20', '2024-06-17', '2024-07-17', '2024-08-15',
+    '2024-10-02', '2024-11-01', '2024-11-15', '2024-11-20', '2024-12-25',
+    '2025-02-26', '2025-03-14', '2025-03-31', '2025-04-10', '2025-04-14', '2025-04-18',
+    '2025-05-01', '2025-08-15', '2025-08-27', '2025-10-02', '2025-10-21', '2025-10-22',
+    '2025-11-05', '2025-12-25',
+]
+
+CALENDAR_COLUMNS = ['underlying', 'kind', 'expiry_year', 'expiry_month', 'expiry_day', 'expiry_date']
+
+# Cache files are keyed by the rules and holidays, so editing either rebuilds the table
+CALENDAR_VERSION = hashlib.sha1(repr((EXPIRY_RULES, NSE_HOLIDAYS)).encode()).hexdigest()[:8]
+
+_loaded_calendars = {}
+
+
+def build_expiry_calendar(start_year, end_year, holidays=NSE_HOLIDAYS):
+    """
+    Build weekly and monthly expiries for every rule in EXPIRY_RULES between
+    start_year and end_year (inclusive), shifted back over weekends and holidays.
+    Weekly rows are keyed by their actual expiry day, since that is what weekly
+    symbols encode; monthly rows carry expiry_day 0 and are keyed by month only.
+    """
+    window_start = pd.Timestamp(year=start_year, month=1, day=1)
+    window_end = pd.Timestamp(year=end_year, month=12, day=31)
+    holidays = np.array(holidays, dtype='datetime64[D]')
+
+    frames = []
+    for underlying, kind, weekday, valid_from, valid_to in EXPIRY_RULES:
+        start = max(pd.Timestamp(valid_from), window_start)
+        end = min(pd.Timestamp(valid_to), window_end) if valid_to else window_end
+        if start > end:
+            continue
+        nominal = pd.Series(pd.date_range(start, end, freq=f'W-{weekday}'))
+        if nominal.empty:
+            continue
+        if kind == 'monthly':
+            nominal = nominal.groupby(nominal.dt.to_period('M')).max().reset_index(drop=True)
+        shifted = np.busday_offset(nominal.values.astype('datetime64[D]'), 0,
+                                   roll='backward', holidays=holidays)
+        expiry = pd.Series(pd.to_datetime(shifted))
+        frames.append(pd.DataFrame({
+            'underlying': underlying,
+            'kind': kind,
+            'expiry_year': expiry.dt.year,
+            'expiry_month': expiry.dt.month,
+            'expiry_day': expiry.dt.day if kind == 'weekly' else 0,
+            'expiry_date': expiry,
+        }))
+
+    calendar = pd.concat(frames, ignore_index=True)[CALENDAR_COLUMNS]
+    return calendar.drop_duplicates(['underlying', 'expiry_year', 'expiry_month', 'expiry_day'])
+
+
+def load_expiry_calendar(start_year, end_year, cache_dir=CACHE_DIR):
+    """Return the expiry calendar for the year range, building it once and caching it on disk."""
+    key = (start_year, end_year)
+    if key in _loaded_calendars:
+        return _loaded_calendars[key]
+
+    cache_path = os.path.join(cache_dir, f'expiry_calendar_{CALENDAR_VERSION}_{start_year}_{end_year}.csv')
+    if os.path.exists(cache_path):
+        calendar = pd.read_csv(cache_path, parse_dates=['expiry_date'])
+    else:
+        calendar = build_expiry_calendar(start_year, end_year)
+        os.makedirs(cache_dir, exist_ok=True)
+        calendar.to_csv(cache_path, index=False)
+
+    _loaded_calendars[key] = calendar
+    return calendar
+
+
+def resolve_expiries(contracts):
+    """
+    Look up exact expiry dates for parsed contracts with one vectorized merge.
+    `contracts` needs underlying, expiry_year, expiry_month and expiry_day
+    (NaN for monthly symbols). Returns a datetime Series aligned to `contracts`,
+    NaT where the calendar has no matching expiry.
+    """
+    years = contracts['expiry_year'].dropna()
+    if years.empty:
+        return pd.Series(pd.NaT, index=contracts.index, dtype='datetime64[ns]')
+    calendar = load_expiry_calendar(int(years.min()), int(years.max()))
+
+    known = set(calendar['underlying'])
+    keys = pd.DataFrame({
+        'underlying': contracts['underlying'].where(contracts['underlying'].isin(known), DEFAULT_UNDERLYING),
+        'expiry_year': contracts['expiry_year'],
+        'expiry_month': contracts['expiry_month'],
+        'expiry_day': contracts['expiry_day'].fillna(0),
+    })
+    lookup = calendar.drop(columns='kind').astype({'expiry_year': float, 'expiry_month': float, 'expiry_day': float})
+    resolved = keys.merge(lookup, how='left', on=['underlying', 'expiry_year', 'expiry_month', 'expiry_day'])
+    return pd.Series(resolved['expiry_date'].values, index=contracts.index)
@@ -0,0 +1,121 @@
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+import pandas as pd
+
+from charges import fill_charges, period_charges, WEEK
+from lot_ledger import COST_BASIS_METHODS
+from phase1_data_preparation import run_phase1
+from phase2_entry_exit_matching import run_phase2
+
+ENTRY_COLUMNS = ['date', 'realised_pnl', 'charges', 'funds_in_out']
+
+NavHistory = namedtuple('NavHistory', ['entries', 'history', 'open_lots'])
+
+
+def _nav_service():
+    # FundEntry and the NAV calculation live in the web app, importable from the repository root
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    from app.models.nav import FundEntry
+    from app.services.nav_service import calculate_fund_state
+    return FundEntry, calculate_fund_state
+
+
+def open_at(realised_pnl, as_of):
+    """Expiry rows of the Phase 2 realised P&L for lots still open on `as_of`, i.e. expiring after it."""
+    expiry = realised_pnl['event'] == 'expiry'
+    return realised_pnl[expiry & (pd.to_datetime(realised_pnl['date']) > pd.Timestamp(as_of))]
+
+
+def weekly_entries(realised_pnl, charges, initial_capital, funds=None, freq=WEEK, as_of=None):
+    """
+    One row per period (weekly by default, labelled by its last day) of booked P&L from
+    the Phase 2 ledger, charges from `fill_charges` and fund flows (`funds`: date and
+    amount, negative for withdrawals), resampled together; periods without activity
+    are kept with zeros. The ledger books lots left open as worthless at expiry, so
+    those expiring after `as_of` (default: the last fill's date) are still open and
+    left out (see open_at). Fills without a charge rate add nothing to `charges`, so
+    `unpriced_fills` counts them per period. calculate_fund_state takes its first
+    entry as the starting capital only, so an opening row one period before the first
+    carries `initial_capital`.
+    """
+    as_of = charges['trade_date'].max() if as_of is None else pd.Timestamp(as_of)
+    realised_pnl = realised_pnl.drop(open_at(realised_pnl, as_of).index)
+    series = [
+        realised_pnl.assign(date=pd.to_datetime(realised_pnl['date'])).set_index('date')['pnl']
+        .resample(freq).sum().rename('realised_pnl'),
+        period_charges(charges, freq).set_index('date')[['total_charges', 'unpriced_fills']]
+        .rename(columns={'total_charges': 'charges'}),
+    ]
+    if funds is not None and len(funds):
+        series.append(funds.assign(date=pd.to_datetime(funds['date'])).set_index('date')['amount']
+                      .resample(freq).sum().rename('funds_in_out'))
+    weekly = pd.concat(series, axis=1).asfreq(freq).fillna(0.0)
+    weekly = weekly.reindex(columns=ENTRY_COLUMNS[1:] + ['unpriced_fills'], fill_value=0.0)
+
+    opening = pd.DataFrame({'realised_pnl': 0.0, 'charges': 0.0, 'funds_in_out': float(initial_capital),
+                            'unpriced_fills': 0}, index=[weekly.index[0] - pd.tseries.frequencies.to_offset(freq)])
+    entries = pd.concat([opening, weekly]).round(2).rename_axis('date').reset_index()
+    return entries[ENTRY_COLUMNS + ['unpriced_fills']].astype({'unpriced_fills': int})
+
+
+def nav_history(entries):
+    """
+    Run `entries` (see weekly_entries) through nav_service.calculate_fund_state; returns
+    every FundEntry field, plus `unpriced_fills` when `entries` has it.
+    """
+    FundEntry, calculate_fund_state = _nav_service()
+    records = entries[ENTRY_COLUMNS].assign(date=pd.to_datetime(entries['date']).dt.date).to_dict('records')
+    state = calculate_fund_state([FundEntry(**record) for record in records])
+    history = pd.DataFrame([vars(entry) for entry in state])
+    if 'unpriced_fills' in entries:
+        history['unpriced_fills'] = entries['unpriced_fills'].to_numpy()
+    return history
+
+
+def build_nav_history(raw, initial_capital, funds=None, method='fifo', freq=WEEK, as_of=None):
+    """
+    Rebuild weekly fund entries and the NAV from a raw tradebook as of `as_of` (default:
+    the last fill's date). Returns a NavHistory; `open_lots` are the ledger's expiry
+    rows of lots still open then, left out of the entries.
+    """
+    _annotated, ledger = run_phase2(run_phase1(raw), method=method)
+    charges = fill_charges(raw)
+    as_of = charges['trade_date'].max() if as_of is None else pd.Timestamp(as_of)
+    entries = weekly_entries(ledger.realised_pnl, charges, initial_capital, funds, freq, as_of)
+    return NavHistory(entries, nav_history(entries), open_at(ledger.realised_pnl, as_of))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild weekly fund entries and NAV history from a tradebook')
+    parser.add_argument('tradebook', nargs='?', default='tradebook-KG2302-FO-last-FY.csv')
+    parser.add_argument('--initial-capital', type=float, required=True, help='Fund value before the first week')
+    parser.add_argument('--funds', default=None, help='CSV of later fund flows (date, amount; negative to withdraw)')
+    parser.add_argument('--method', choices=COST_BASIS_METHODS, default='fifo',
+                        help='Cost basis used to match exits and book realised P&L')
+    parser.add_argument('--freq', default=WEEK, help='pandas period of the entries (default weekly, ending Friday)')
+    parser.add_argument('--as-of', default=None,
+                        help='Lots expiring after this date are still open (default: the last fill\'s date)')
+    parser.add_argument('--output', default='nav_history.csv')
+    args = parser.parse_args()
+
+    funds = pd.read_csv(args.funds) if args.funds else None
+    entries, history, open_lots = build_nav_history(pd.read_csv(args.tradebook), args.initial_capital, funds,
+                                                    args.method, args.freq, args.as_of)
+    history.to_csv(args.output, index=False)
+
+    last = history.iloc[-1]
+    print(f"{len(history)} fund entries from {history['date'].iloc[0]} to {last['date']} saved to {args.output}")
+    print(f"Booked P&L {entries['realised_pnl'].sum():,.2f}, charges {entries['charges'].sum():,.2f}; "
+          f"NAV {last['nav']:.4f}, peak {last['nav_peak']:.4f}, max drawdown {history['nav_drawdown'].max():.2f}%")
+    unpriced = history['unpriced_fills']
+    if unpriced.any():
+        print(f"Warning: {unpriced.sum()} fills in {(unpriced > 0).sum()} periods have no charge rate and were "
+              f"booked without charges, so NAV is overstated there (see unpriced_fills)")
+    if len(open_lots):
+        print(f"{len(open_lots)} lots ({open_lots['qty'].sum()} contracts) expiring after "
+              f"{args.as_of or 'the last fill'} are still open and left out of booked P&L")
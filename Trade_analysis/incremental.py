@@ -0,0 +1,154 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from expiry_calendar import CACHE_DIR
+from lot_ledger import LotLedger, book_realised_pnl
+from phase1_data_preparation import run_phase1
+from phase2_entry_exit_matching import prepare_fills
+from phase3_daily_position_book import run_phase3
+from phase4_strategy_identification import run_phase4, make_detector
+from phase5_mtm_calculation import run_phase5
+
+STATE_PATH = os.path.join(CACHE_DIR, 'pipeline_state.pkl')
+
+
+class PipelineState:
+    """
+    Everything an append needs to continue from the previous run: the lot ledger with
+    its open lots and per-key state, the cumulative phase outputs, and per-date digests
+    of the daily book and realised P&L used to tell which dates changed.
+    """
+
+    def __init__(self, method='fifo', templates=None):
+        self.method = method
+        self.templates = templates
+        self.raw_rows = 0
+        self.ledger = LotLedger(method)
+        self.trades = None
+        self.annotated = None
+        self.lots = None
+        self.exit_pnl = None
+        self.realised_pnl = None
+        self.book = None
+        self.daily_positions = None
+        self.strategies = None
+        self.strategy_pnl = None
+        self.daily_digests = {}
+        self.pnl_digests = {}
+
+    @property
+    def watermark(self):
+        """Execution time of the latest fill applied, or None before the first run."""
+        return None if self.annotated is None else self.annotated['order_execution_time'].max()
+
+
+def _date_digests(df, columns):
+    # Bytes of the row hashes of each date, in row order
+    hashes = pd.Series(pd.util.hash_pandas_object(df[columns], index=False).to_numpy())
+    return hashes.groupby(df['date'].to_numpy(), sort=False).agg(lambda h: h.to_numpy().tobytes()).to_dict()
+
+
+def _changed_dates(old, new):
+    return {date for date in old.keys() | new.keys() if old.get(date) != new.get(date)}
+
+
+def _splice(old, new, dates):
+    """Rows of `old` outside `dates` merged with `new` (rows for `dates`), in date order."""
+    if old is None:
+        return new.reset_index(drop=True)
+    kept = old[~old['date'].isin(dates)]
+    return pd.concat([kept, new], ignore_index=True).sort_values('date', kind='stable').reset_index(drop=True)
+
+
+def append_fills(state, raw, workers=1):
+    """
+    Apply new raw tradebook rows to `state` in place; results equal a full rebuild over
+    every row applied so far. Fills at or after the state's watermark continue the lot
+    ledger; an earlier fill replays the ledger from scratch. Strategies are re-detected
+    only on dates whose daily positions changed, and P&L re-attributed only on those
+    dates and dates whose realised P&L changed. Returns counts of what was recomputed.
+    """
+    raw = raw.set_axis(pd.RangeIndex(state.raw_rows, state.raw_rows + len(raw)))
+    state.raw_rows += len(raw)
+
+    # Phase 1 is row-wise, so new rows are prepared on their own
+    new_trades = run_phase1(raw)
+    state.trades = new_trades if state.trades is None else pd.concat([state.trades, new_trades])
+
+    # Phase 2: continue the ledger, or replay it if a fill lands before the watermark
+    new_fills = prepare_fills(new_trades)
+    watermark = state.watermark
+    replay = watermark is not None and len(new_fills) and new_fills['order_execution_time'].min() < watermark
+    if replay:
+        state.ledger = LotLedger(state.method)
+        new_fills = prepare_fills(state.trades)
+        previous_fills, closes_before = None, 0
+    else:
+        new_fills.index = pd.RangeIndex(state.ledger.rows, state.ledger.rows + len(new_fills))
+        previous_fills, closes_before = state.annotated, len(state.ledger.close_lots)
+
+    annotations, touched = state.ledger.apply(new_fills)
+    new_fills[annotations.columns] = annotations
+    fills = new_fills if previous_fills is None else pd.concat([previous_fills, new_fills])
+    state.annotated = fills
+
+    if previous_fills is None:
+        state.lots = state.ledger.lot_table(fills)
+        state.exit_pnl = state.ledger.exit_pnl(fills, state.lots)
+    else:
+        # Only lots opened or closed by the new fills change
+        updated = state.ledger.lot_table(fills, touched)
+        state.lots = pd.concat([state.lots[~state.lots['lot_id'].isin(touched)], updated]) \
+            .sort_values('lot_id').reset_index(drop=True)
+        state.exit_pnl = pd.concat([state.exit_pnl, state.ledger.exit_pnl(fills, state.lots, closes_before)],
+                                   ignore_index=True)
+    state.realised_pnl = book_realised_pnl(state.exit_pnl, state.lots)
+
+    # Phase 3: the interval book is rebuilt from the lot table in one vectorized pass
+    state.book, daily = run_phase3(state.lots)
+    state.daily_positions = daily
+
+    # Phase 4: re-detect only dates whose open legs changed
+    daily_digests = _date_digests(daily, list(daily.columns))
+    detect_dates = _changed_dates(state.daily_digests, daily_digests)
+    changed_days = daily[daily['date'].isin(detect_dates)]
+    if len(changed_days):
+        strategies = run_phase4(changed_days, make_detector(state.templates), workers=workers)
+        state.strategies = _splice(state.strategies, strategies, detect_dates)
+    elif state.strategies is not None:
+        state.strategies = _splice(state.strategies, state.strategies.iloc[:0], detect_dates)
+    state.daily_digests = daily_digests
+
+    # Phase 5: re-attribute dates with new strategies or new realised P&L
+    pnl_digests = _date_digests(state.realised_pnl, ['date', 'strike', 'option_type', 'pnl'])
+    attribute_dates = detect_dates | _changed_dates(state.pnl_digests, pnl_digests)
+    if state.strategies is not None:
+        affected = state.strategies[state.strategies['date'].isin(attribute_dates)]
+        state.strategy_pnl = _splice(state.strategy_pnl, run_phase5(state.realised_pnl, affected), attribute_dates)
+    state.pnl_digests = pnl_digests
+
+    return {
+        'fills': len(new_trades),
+        'replayed': bool(replay),
+        'lots_updated': len(state.lots) if previous_fills is None else len(touched),
+        'dates_detected': int(np.count_nonzero(np.isin(list(detect_dates), list(daily_digests)))),
+        'dates_attributed': len(attribute_dates),
+    }
+
+
+def build_state(raw, method='fifo', templates=None, workers=1):
+    """Full build of a PipelineState from a raw tradebook (an append onto an empty state)."""
+    state = PipelineState(method, templates)
+    append_fills(state, raw, workers=workers)
+    return state
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    pd.to_pickle(state, path)
+
+
+def load_state(path=STATE_PATH):
+    return pd.read_pickle(path)
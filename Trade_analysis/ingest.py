@@ -0,0 +1,88 @@
+import tracemalloc
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from phase1_data_preparation import run_phase1
+
+# Compact dtypes for the raw tradebook columns. Prices stay float64: float32 would
+# move P&L by fractions of a paisa, and strikes are parsed from the symbol.
+TRADEBOOK_DTYPES = {
+    'symbol': 'category',
+    'isin': 'category',
+    'exchange': 'category',
+    'segment': 'category',
+    'series': 'category',
+    'trade_type': 'category',
+    'quantity': 'int32',
+    'price': 'float64',
+    'trade_date': 'str',
+    'expiry_date': 'str',
+    'order_execution_time': 'str',
+}
+# Phase 1 columns compacted after each chunk
+CATEGORY_COLUMNS = ['symbol', 'isin', 'exchange', 'segment', 'series', 'trade_type', 'underlying', 'option_type']
+FLOAT32_COLUMNS = ['expiry_year', 'expiry_month', 'expiry_day']
+
+
+def _compact(trades):
+    for col in CATEGORY_COLUMNS:
+        if col in trades:
+            trades[col] = trades[col].astype('category')
+    for col in FLOAT32_COLUMNS:
+        if col in trades:
+            trades[col] = trades[col].astype('float32')
+    trades['order_execution_time'] = pd.to_datetime(trades['order_execution_time'])
+    return trades
+
+
+def _concat_chunks(chunks):
+    # pd.concat turns categoricals with different categories into object; union them instead
+    columns = {}
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            columns[col] = union_categoricals([chunk[col] for chunk in chunks])
+        else:
+            columns[col] = pd.concat([chunk[col] for chunk in chunks]).to_numpy()
+    index = pd.Index(pd.concat([chunk.index.to_series() for chunk in chunks]))
+    return pd.DataFrame(columns, index=index)
+
+
+def ingest_tradebook(path, chunksize=100_000, track_memory=False):
+    """
+    Phase 1 over a tradebook CSV read `chunksize` rows at a time with compact dtypes.
+
+    Phase 1 is row-wise, so each chunk is cleaned on its own and only the compacted
+    result is kept; at most one raw chunk is alive at a time. Chunks are joined with
+    shared categories and sorted by execution time (stable, ties in file order).
+    Returns (trades, stats); stats has rows read and kept, chunks, the frame's memory
+    and, with `track_memory`, the peak traced allocation during ingestion.
+    """
+    if track_memory:
+        tracemalloc.start()
+    chunks = []
+    rows = 0
+    # Header may carry spaces or capitals; phase 1 normalizes them, dtypes need the raw names
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {col: TRADEBOOK_DTYPES[col.strip().lower()] for col in header
+              if col.strip().lower() in TRADEBOOK_DTYPES}
+
+    # Chunks carry a running index, so trade ids hash as in a single read
+    for raw in pd.read_csv(path, dtype=dtypes, chunksize=chunksize):
+        rows += len(raw)
+        chunks.append(_compact(run_phase1(raw)))
+        del raw
+
+    trades = _concat_chunks(chunks)
+    del chunks
+    trades = trades.sort_values('order_execution_time', kind='stable')
+    stats = {
+        'rows_read': rows,
+        'rows_kept': len(trades),
+        'chunks': -(-rows // chunksize),
+        'frame_bytes': int(trades.memory_usage(deep=True).sum()),
+    }
+    if track_memory:
+        stats['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return trades, stats
@@ -0,0 +1,127 @@
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def cpu_seconds():
+    """User and system CPU time of this process and its finished children (e.g. phase 4 workers)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def peak_rss():
+    """Peak resident set size of this process so far in bytes, or None where it cannot be read."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().peak_wset
+
+
+class RunReport:
+    """
+    Per-phase measurements of one pipeline run: wall and CPU time, input and output
+    row counts, throughput and peak RSS. CPU time includes worker processes that
+    finished within the phase. The process peak only ever grows, so each
+    phase records the peak at its end and how much it raised it (`rss_growth_bytes`);
+    a phase that stays under an earlier peak shows no growth.
+
+    With `profile`, every phase runs under cProfile and the slowest phase's profile
+    is kept for `dump_profile`.
+    """
+
+    def __init__(self, profile=False):
+        self.profile = profile
+        self.started = datetime.now()
+        self.phases = []
+        self._profiles = {}
+
+    @contextmanager
+    def phase(self, name, rows_in=None):
+        """Measure the enclosed block as phase `name`; set `rows_out` on the yielded record."""
+        record = {'phase': name, 'rows_in': rows_in, 'rows_out': None}
+        profiler = cProfile.Profile() if self.profile else None
+        rss_before = peak_rss()
+        cpu, wall = cpu_seconds(), time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+                self._profiles[name] = profiler
+            record['wall_seconds'] = time.perf_counter() - wall
+            record['cpu_seconds'] = cpu_seconds() - cpu
+            rss_after = peak_rss()
+            record['peak_rss_bytes'] = rss_after
+            record['rss_growth_bytes'] = None if rss_after is None else rss_after - rss_before
+            record['rows_per_second'] = (record['rows_in'] / record['wall_seconds']
+                                         if record['rows_in'] is not None and record['wall_seconds'] else None)
+            self.phases.append(record)
+
+    def track(self, name, compute, rows_in=None, rows_out=len):
+        """Run `compute()` as phase `name`; `rows_out` maps its output to a row count."""
+        with self.phase(name, rows_in) as record:
+            out = compute()
+            record['rows_out'] = rows_out(out)
+        return out
+
+    @property
+    def slowest(self):
+        return max(self.phases, key=lambda record: record['wall_seconds'])['phase'] if self.phases else None
+
+    def to_dict(self):
+        return {
+            'started': self.started.isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'wall_seconds': sum(record['wall_seconds'] for record in self.phases),
+            'cpu_seconds': sum(record['cpu_seconds'] for record in self.phases),
+            'peak_rss_bytes': peak_rss(),
+            'slowest_phase': self.slowest,
+            'phases': self.phases,
+        }
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def dump_profile(self, path):
+        """
+        Write the slowest phase's cProfile stats (readable with pstats or snakeviz); returns
+        that phase, or None with an empty profile when no phase ran (e.g. all cache hits).
+        """
+        if not self.profile:
+            raise ValueError("RunReport was created without profile=True")
+        name = self.slowest
+        profiler = self._profiles.get(name)
+        if profiler is None:
+            # pstats cannot load a profile with no entries, so record an empty span
+            profiler = cProfile.Profile()
+            profiler.enable()
+            profiler.disable()
+        profiler.dump_stats(path)
+        return name
+
+    def summary(self):
+        table = pd.DataFrame(self.phases, columns=['phase', 'wall_seconds', 'cpu_seconds', 'rows_in', 'rows_out',
+                                                   'rows_per_second', 'peak_rss_bytes'])
+        table['peak_rss_mib'] = table.pop('peak_rss_bytes') / 2**20
+        return table.set_index('phase').round(3).to_string()
@@ -0,0 +1,271 @@
+from collections import defaultdict, deque, namedtuple
+import numpy as np
+import pandas as pd
+
+ENTRY = 'Entry'
+EXIT = 'Exit'
+PARTIAL_EXIT = 'Partial Exit'
+
+# fifo/lifo close the oldest/newest lot first; average closes FIFO but books
+# P&L against the running weighted-average cost of the open position
+COST_BASIS_METHODS = ('fifo', 'lifo', 'average')
+
+LedgerResult = namedtuple('LedgerResult', ['annotations', 'lots', 'realised_pnl'])
+PNL_COLUMNS = ['date', 'lot_id', 'position_key', 'symbol', 'underlying', 'expiry', 'strike',
+               'option_type', 'qty', 'entry_price', 'exit_price', 'pnl', 'event']
+
+
+class Lot:
+    """An opening fill and how much of it is still open. Rows point back into the fills."""
+    __slots__ = ('lot_id', 'row', 'trade_id', 'cost', 'sign', 'open_qty', 'remaining', 'close_qty', 'close_row')
+
+    def __init__(self, lot_id, row, trade_id, qty, cost):
+        self.lot_id = lot_id
+        self.row = row
+        self.trade_id = trade_id
+        self.cost = cost
+        self.sign = 1 if qty > 0 else -1
+        self.open_qty = abs(qty)
+        self.remaining = abs(qty)
+        self.close_qty = 0
+        self.close_row = -1
+
+
+class LotLedger:
+    """
+    Lot matching state that can be carried across runs: every lot, the open lots, net
+    quantity and open cost per position_key, and the closed chunks booked so far.
+
+    `apply` matches the next fills in execution order, numbering their rows after the
+    fills already applied, so applying a tradebook in consecutive slices gives the
+    same lots and P&L as applying it in one go. The tables are built against the
+    cumulative fills.
+    """
+
+    def __init__(self, method='fifo'):
+        if method not in COST_BASIS_METHODS:
+            raise ValueError(f"Unknown cost basis method '{method}', expected one of {COST_BASIS_METHODS}")
+        self.method = method
+        self.rows = 0
+        self.lots = []
+        self.open_lots = defaultdict(deque)
+        self.net_position = defaultdict(int)
+        self.open_cost = defaultdict(float)
+        # Closed chunks, stored columnar: (exit row, lot, quantity, entry price)
+        self.close_rows, self.close_lots, self.close_qtys, self.close_costs = [], [], [], []
+
+    def apply(self, fills):
+        """
+        Match `fills` (needs position_key, net_qty, price and trade_id) after those already
+        applied. Returns (annotations aligned to `fills`, ids of the lots opened or closed).
+        """
+        lifo = self.method == 'lifo'
+        average = self.method == 'average'
+        lots, open_lots, net_position, open_cost = self.lots, self.open_lots, self.net_position, self.open_cost
+        close_rows, close_lots, close_qtys, close_costs = \
+            self.close_rows, self.close_lots, self.close_qtys, self.close_costs
+        first_lot, first_close = len(lots), len(close_lots)
+
+        n = len(fills)
+        keys = fills['position_key'].tolist()
+        qtys = fills['net_qty'].tolist()
+        prices = fills['price'].to_numpy(dtype=float).tolist()
+        trade_ids = fills['trade_id'].astype(str).tolist()
+
+        entry_exit = np.empty(n, dtype=object)
+        matched_qty = np.zeros(n, dtype=np.int64)
+        matched_trade_ids = np.full(n, None, dtype=object)
+
+        for i, (key, qty, price) in enumerate(zip(keys, qtys, prices)):
+            row = self.rows + i
+            position = net_position[key]
+            net_position[key] = position + qty
+
+            if position == 0 or (position > 0) == (qty > 0):
+                lot = Lot(len(lots), row, trade_ids[i], qty, price)
+                lots.append(lot)
+                open_lots[key].append(lot)
+                open_cost[key] += abs(qty) * price
+                entry_exit[i] = ENTRY
+                matched_qty[i] = abs(qty)
+                continue
+
+            queue = open_lots[key]
+            remaining = abs(qty)
+            matched_ids = []
+            average_cost = open_cost[key] / abs(position)
+            while remaining and queue:
+                lot = queue[-1] if lifo else queue[0]
+                close_now = min(remaining, lot.remaining)
+                cost = average_cost if average else lot.cost
+                open_cost[key] -= close_now * cost
+                lot.remaining -= close_now
+                lot.close_qty += close_now
+                lot.close_row = row
+                remaining -= close_now
+                matched_ids.append(lot.trade_id)
+                close_rows.append(row)
+                close_lots.append(lot.lot_id)
+                close_qtys.append(close_now)
+                close_costs.append(cost)
+                if lot.remaining == 0 and lifo:
+                    queue.pop()
+                elif lot.remaining == 0:
+                    queue.popleft()
+
+            if remaining:
+                # Closing more than was open flips the position
+                lot = Lot(len(lots), row, trade_ids[i], remaining if qty > 0 else -remaining, price)
+                lots.append(lot)
+                queue.append(lot)
+                open_cost[key] = remaining * price
+            elif net_position[key] == 0:
+                open_cost[key] = 0.0
+
+            entry_exit[i] = PARTIAL_EXIT if remaining else EXIT
+            matched_qty[i] = abs(qty) - remaining
+            matched_trade_ids[i] = ';'.join(matched_ids)
+
+        self.rows += n
+        touched = set(close_lots[first_close:]) | set(range(first_lot, len(lots)))
+        if average:
+            # Average cost shown on open lots moves with every fill on their key
+            touched.update(lot.lot_id for key in set(keys) for lot in open_lots[key])
+
+        annotations = pd.DataFrame({
+            'entry_exit': entry_exit,
+            'matched_qty': matched_qty,
+            'matched_trade_ids': matched_trade_ids,
+        }, index=fills.index)
+        return annotations, sorted(touched)
+
+    def lot_costs(self, lots):
+        """Cost basis per lot; with average cost, lots still open carry their key's average."""
+        costs = [lot.cost for lot in lots]
+        if self.method == 'average':
+            average = {}
+            for key, queue in self.open_lots.items():
+                for lot in queue:
+                    average[lot.lot_id] = self.open_cost[key] / abs(self.net_position[key])
+            costs = [average.get(lot.lot_id, cost) for lot, cost in zip(lots, costs)]
+        return costs
+
+    def lot_table(self, fills, lot_ids=None):
+        """Lots (all, or `lot_ids`) as rows; `fills` are all fills applied so far."""
+        lots = self.lots if lot_ids is None else [self.lots[i] for i in lot_ids]
+        return _build_lots(fills, lots, self.lot_costs(lots))
+
+    def exit_pnl(self, fills, lots_df, start=0):
+        """Realised P&L of closed chunks from the `start`-th on, against the full lot table."""
+        return _exit_pnl(fills, lots_df, self.close_rows[start:], self.close_lots[start:],
+                         self.close_qtys[start:], self.close_costs[start:])
+
+
+def run_lot_ledger(fills, method='fifo'):
+    """
+    Match fills per position_key in one pass over fills already sorted in execution order.
+    `fills` needs position_key, symbol, underlying, expiry_date, strike, option_type,
+    net_qty, price, trade_id and trade_date.
+
+    A fill in the direction of the open position (or on a flat key) opens a lot; an
+    opposite fill closes lots in `method` order (see COST_BASIS_METHODS), and any
+    quantity left over opens a new lot the other way. Net quantity and open cost
+    are kept per key, so each fill costs O(lots it closes). Returns a LedgerResult with:
+      - annotations: entry_exit, matched_qty, matched_trade_ids aligned to `fills`
+      - lots: one row per lot with its open and (last) close
+      - realised_pnl: one row per closed chunk, plus lots left open booked at expiry
+    """
+    ledger = LotLedger(method)
+    annotations, _ = ledger.apply(fills)
+    lots_df = ledger.lot_table(fills)
+    pnl_df = book_realised_pnl(ledger.exit_pnl(fills, lots_df), lots_df)
+    return LedgerResult(annotations, lots_df, pnl_df)
+
+
+def _build_lots(fills, lots, costs):
+    open_rows = np.fromiter((lot.row for lot in lots), dtype=np.int64, count=len(lots))
+    close_rows = np.fromiter((lot.close_row for lot in lots), dtype=np.int64, count=len(lots))
+    opened = fills.iloc[open_rows]
+    closed = fills.iloc[np.where(close_rows >= 0, close_rows, 0)]
+    is_closed = close_rows >= 0
+
+    return pd.DataFrame({
+        'lot_id': np.fromiter((lot.lot_id for lot in lots), dtype=np.int64, count=len(lots)),
+        'position_key': opened['position_key'].to_numpy(),
+        'symbol': opened['symbol'].to_numpy(),
+        'underlying': opened['underlying'].to_numpy(),
+        'expiry': opened['expiry_date'].to_numpy(),
+        'strike': opened['strike'].to_numpy(),
+        'option_type': opened['option_type'].to_numpy(),
+        'direction': np.where([lot.sign > 0 for lot in lots], 'Long', 'Short'),
+        'open_qty': [lot.open_qty for lot in lots],
+        'open_date': opened['trade_date'].to_numpy(),
+        'open_price': opened['price'].to_numpy(),
+        'open_trade_id': opened['trade_id'].to_numpy(),
+        'cost_basis': costs,
+        'close_qty': [lot.close_qty for lot in lots],
+        'remaining_qty': [lot.remaining for lot in lots],
+        'close_date': closed['trade_date'].where(is_closed).to_numpy(),
+        'close_price': closed['price'].where(is_closed).to_numpy(),
+    })
+
+
+def _exit_pnl(fills, lots_df, close_rows, close_lots, close_qtys, close_costs):
+    sign = np.where(lots_df['direction'] == 'Long', 1, -1)
+
+    # Realised at the closing fill
+    close_lots = np.asarray(close_lots, dtype=np.int64)
+    exits = fills.iloc[np.asarray(close_rows, dtype=np.int64)]
+    closed = lots_df.iloc[close_lots]
+    qty = np.asarray(close_qtys, dtype=np.int64)
+    exit_pnl = pd.DataFrame({
+        'date': exits['trade_date'].to_numpy(),
+        'lot_id': close_lots,
+        'position_key': closed['position_key'].to_numpy(),
+        'symbol': closed['symbol'].to_numpy(),
+        'underlying': closed['underlying'].to_numpy(),
+        'expiry': closed['expiry'].to_numpy(),
+        'strike': closed['strike'].to_numpy(),
+        'option_type': closed['option_type'].to_numpy(),
+        'qty': qty,
+        'entry_price': np.asarray(close_costs, dtype=float),
+        'exit_price': exits['price'].to_numpy(),
+        'event': 'exit',
+    })
+    exit_pnl['pnl'] = (exit_pnl['exit_price'] - exit_pnl['entry_price']) * qty * sign[close_lots]
+    return exit_pnl[PNL_COLUMNS]
+
+
+def book_realised_pnl(exit_pnl, lots_df):
+    """Realised P&L: the closed chunks in `exit_pnl`, then lots still open in `lots_df` booked at expiry."""
+    sign = np.where(lots_df['direction'] == 'Long', 1, -1)
+
+    # Lots still open are assumed to expire worthless on their expiry date
+    still_open = (lots_df['remaining_qty'] > 0) & lots_df['expiry'].notna()
+    expired = lots_df[still_open]
+    expiry_pnl = pd.DataFrame({
+        'date': expired['expiry'].to_numpy(),
+        'lot_id': expired['lot_id'].to_numpy(),
+        'position_key': expired['position_key'].to_numpy(),
+        'symbol': expired['symbol'].to_numpy(),
+        'underlying': expired['underlying'].to_numpy(),
+        'expiry': expired['expiry'].to_numpy(),
+        'strike': expired['strike'].to_numpy(),
+        'option_type': expired['option_type'].to_numpy(),
+        'qty': expired['remaining_qty'].to_numpy(),
+        'entry_price': expired['cost_basis'].to_numpy(),
+        'exit_price': 0.0,
+        'event': 'expiry',
+    })
+    expiry_pnl['pnl'] = -expiry_pnl['entry_price'] * expiry_pnl['qty'] * sign[still_open.to_numpy()]
+
+    return pd.concat([exit_pnl, expiry_pnl[PNL_COLUMNS]], ignore_index=True)
+
+
+def compare_cost_basis(fills, methods=COST_BASIS_METHODS):
+    """Realised P&L per date under each cost basis method, one column per method."""
+    totals = {
+        method: run_lot_ledger(fills, method).realised_pnl.groupby('date')['pnl'].sum()
+        for method in methods
+    }
+    return pd.DataFrame(totals).fillna(0.0)
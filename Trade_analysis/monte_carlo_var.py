@@ -0,0 +1,199 @@
+import argparse
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from black_scholes import price, MIN_VOL, RISK_FREE_RATE
+from candle_cache import CANDLE_DIR
+from expiry_calendar import NSE_HOLIDAYS
+from phase7_greeks import load_underlying_prices, LOT_GREEKS_FILE
+from scenario_grid import open_contracts
+
+CONFIDENCE_LEVELS = (0.95, 0.99)
+# Decimals of the risk tables the CLI prints
+ROUNDING = {'var': 2, 'es': 2, 'var_pct': 2, 'es_pct': 2}
+# Parallel IV move per trading day (vol points) and its correlation with the underlying's return
+IV_SHIFT_STD = 1.0
+SPOT_VOL_CORR = -0.5
+
+MonteCarloVaR = namedtuple('MonteCarloVaR', ['date', 'horizon_days', 'paths', 'pnl', 'risk', 'unpriced_lots'])
+
+
+def return_covariance(underlying_prices, underlyings, date, lookback=250):
+    """
+    Covariance of daily log returns of `underlyings` over the `lookback` closes up to
+    `date`, on the days all of them closed. Raises ValueError without enough history.
+    """
+    closes = underlying_prices[underlying_prices['date'] <= date] \
+        .pivot_table(index='date', columns='underlying', values='close')
+    missing = [u for u in underlyings if u not in closes]
+    if missing:
+        raise ValueError(f"No underlying closes for {', '.join(missing)}")
+    returns = np.log(closes[list(underlyings)].dropna().tail(lookback + 1)).diff().dropna()
+    if len(returns) < 20:
+        raise ValueError(f"Only {len(returns)} daily returns up to {date:%Y-%m-%d}; need at least 20")
+    return returns.cov().to_numpy()
+
+
+def _simulate_batch(seed, paths, book, chol, horizon_days, iv_shift_std, spot_vol_corr, rate):
+    # P&L of `paths` joint scenarios of the underlyings' returns and parallel IV shifts
+    rng = np.random.default_rng(seed)
+    n = chol.shape[0]
+    daily = rng.standard_normal((paths, n)) @ chol.T
+    variance = np.einsum('ij,ij->i', chol, chol)
+    returns = daily * np.sqrt(horizon_days) - 0.5 * variance * horizon_days
+    # Each underlying's standardized return drives part of its IV move
+    shift = iv_shift_std * np.sqrt(horizon_days) * (
+        spot_vol_corr * daily / np.sqrt(variance) + np.sqrt(1 - spot_vol_corr ** 2) * rng.standard_normal((paths, n)))
+
+    u = book['underlying']
+    spot = book['spot'] * np.exp(returns[:, u])
+    vol = np.maximum(book['iv'] + shift[:, u] / 100.0, MIN_VOL)
+    value = price(spot, book['strike'], book['t_horizon'], vol, book['is_call'], rate)
+    return (value - book['close']) @ book['qty']
+
+
+def simulate_pnl(contracts, cov, paths=50_000, horizon_days=1, seed=0, workers=1, batch_size=5_000,
+                 iv_shift_std=IV_SHIFT_STD, spot_vol_corr=SPOT_VOL_CORR, rate=RISK_FREE_RATE):
+    """
+    Simulated P&L of the `contracts` (from `open_contracts`) over `horizon_days` trading
+    days, one value per path.
+
+    Log returns of the underlyings are joint normal with `cov` (daily, in the order of
+    `contracts['underlying']`'s sorted unique values); each underlying's IV moves in
+    parallel by `iv_shift_std` vol points per sqrt(day), correlated `spot_vol_corr` with
+    its return. Every contract is repriced by Black-Scholes at the close `horizon_days`
+    NSE trading days ahead. Time to expiry is in calendar days over 365 as in Phase 7,
+    so the horizon shortens it by the calendar days it spans, weekends and holidays
+    included. Paths are simulated in batches of `batch_size`, spread over `workers`
+    processes when above 1; each batch draws from its own child of SeedSequence(seed),
+    so a seed gives the same P&L for any number of workers.
+    """
+    codes, _ = pd.factorize(contracts['underlying'], sort=True)
+    dates = contracts['date'].to_numpy().astype('datetime64[D]')
+    horizon_dates = np.busday_offset(dates, horizon_days, roll='forward',
+                                     holidays=np.array(NSE_HOLIDAYS, dtype='datetime64[D]'))
+    expiries = contracts['expiry'].to_numpy().astype('datetime64[D]')
+    book = {
+        'underlying': codes,
+        'spot': contracts['spot'].to_numpy(dtype=float),
+        'strike': contracts['strike'].to_numpy(dtype=float),
+        't_horizon': np.maximum((expiries - horizon_dates).astype(int), 0) / 365.0,
+        'iv': contracts['iv'].to_numpy(dtype=float),
+        'is_call': (contracts['option_type'] == 'CE').to_numpy(),
+        'close': contracts['close'].to_numpy(dtype=float),
+        'qty': contracts['position_qty'].to_numpy(dtype=float),
+    }
+    chol = np.linalg.cholesky(cov + np.eye(len(cov)) * 1e-12)
+    sizes = [batch_size] * (paths // batch_size) + ([paths % batch_size] if paths % batch_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [seeds, sizes] + [[value] * len(sizes) for value in
+                             (book, chol, horizon_days, iv_shift_std, spot_vol_corr, rate)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batches = list(pool.map(_simulate_batch, *args))
+    else:
+        batches = list(map(_simulate_batch, *args))
+    return np.concatenate(batches) if batches else np.zeros(0)
+
+
+def var_es(pnl, confidence=CONFIDENCE_LEVELS, fund_value=None):
+    """
+    Value at risk and expected shortfall (the mean loss beyond VaR) of a P&L sample at
+    each confidence level, as positive losses; with `fund_value`, also in percent of it.
+    """
+    rows = []
+    for level in confidence:
+        var = -np.quantile(pnl, 1 - level)
+        tail = pnl[pnl <= -var]
+        rows.append({'confidence': level, 'var': var, 'es': -tail.mean() if len(tail) else var})
+    risk = pd.DataFrame(rows, columns=['confidence', 'var', 'es'])
+    if fund_value:
+        risk['var_pct'] = risk['var'] / fund_value * 100
+        risk['es_pct'] = risk['es'] / fund_value * 100
+    return risk
+
+
+def historical_var(nav, confidence=CONFIDENCE_LEVELS):
+    """
+    Historical VaR and ES of one period's NAV return, in percent of NAV; the period is
+    the spacing of `nav` (weekly for nav_history.csv from fund_entries.py).
+    """
+    returns = pd.Series(nav, dtype=float).pct_change().dropna().to_numpy() * 100
+    return var_es(returns, confidence).rename(columns={'var': 'var_pct', 'es': 'es_pct'})
+
+
+def run_var(lot_greeks_df, underlying_prices, date=None, paths=50_000, horizon_days=1,
+            confidence=CONFIDENCE_LEVELS, seed=0, workers=1, fund_value=None, lookback=250, **model):
+    """
+    Monte Carlo VaR and ES of the open option book on `date` (default: the last day of
+    the Phase 7 output). `model` is passed to `simulate_pnl`. Returns a MonteCarloVaR.
+    """
+    date = pd.to_datetime(lot_greeks_df['date']).max() if date is None else pd.Timestamp(date)
+    contracts, unpriced = open_contracts(lot_greeks_df, date)
+    if contracts.empty:
+        raise ValueError(f"No priced open contracts on {date:%Y-%m-%d}")
+    cov = return_covariance(underlying_prices, sorted(contracts['underlying'].unique()), date, lookback)
+    pnl = simulate_pnl(contracts, cov, paths, horizon_days, seed, workers, **model)
+    return MonteCarloVaR(date, horizon_days, paths, pnl, var_es(pnl, confidence, fund_value), unpriced)
+
+
+def benchmark(lot_greeks_df, underlying_prices, date=None, paths=50_000, worker_counts=(1, 2, 4), seed=0,
+              **model):
+    """Paths per second of `run_var` at each worker count, checking each matches the first run."""
+    rows, first = [], None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        result = run_var(lot_greeks_df, underlying_prices, date, paths, seed=seed, workers=workers, **model)
+        seconds = time.perf_counter() - start
+        first = result.pnl if first is None else first
+        rows.append({'workers': workers, 'paths': paths, 'seconds': seconds, 'paths_per_second': paths / seconds,
+                     'same_as_first': bool(np.array_equal(result.pnl, first))})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo VaR and expected shortfall of the open option book')
+    parser.add_argument('--date', default=None, help='Book date (default: the last day with open lots)')
+    parser.add_argument('--paths', type=int, default=50_000)
+    parser.add_argument('--horizon-days', type=int, default=1, help='Horizon in trading days')
+    parser.add_argument('--confidence', type=float, nargs='+', default=list(CONFIDENCE_LEVELS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help='Processes for the simulation batches')
+    parser.add_argument('--batch-size', type=int, default=5_000)
+    parser.add_argument('--iv-shift-std', type=float, default=IV_SHIFT_STD,
+                        help='Daily std of the parallel IV move, vol points')
+    parser.add_argument('--spot-vol-corr', type=float, default=SPOT_VOL_CORR)
+    parser.add_argument('--underlying-prices', default=None,
+                        help='CSV of underlying closes (date, underlying, close); default: the candle cache')
+    parser.add_argument('--candle-dir', default=CANDLE_DIR)
+    parser.add_argument('--fund-value', type=float, default=None, help='Report VaR in percent of this fund value')
+    parser.add_argument('--lot-greeks', default=LOT_GREEKS_FILE, help='Phase 7 open lots with IVs')
+    parser.add_argument('--nav-history', default=None,
+                        help='CSV with a nav column (e.g. nav_history.csv from fund_entries.py) '
+                             'for historical VaR alongside')
+    parser.add_argument('--benchmark', type=int, nargs='+', default=None, metavar='WORKERS',
+                        help='Time the simulation at these worker counts instead')
+    args = parser.parse_args()
+
+    lot_greeks = pd.read_csv(args.lot_greeks, parse_dates=['date', 'expiry'])
+    prices = load_underlying_prices(args.underlying_prices, args.candle_dir, lot_greeks['underlying'].unique())
+    model = {'batch_size': args.batch_size, 'iv_shift_std': args.iv_shift_std, 'spot_vol_corr': args.spot_vol_corr}
+    if args.benchmark:
+        print(f"{os.cpu_count()} CPUs")
+        print(benchmark(lot_greeks, prices, args.date, args.paths, args.benchmark, args.seed, **model)
+              .round(3).to_string(index=False))
+    else:
+        result = run_var(lot_greeks, prices, args.date, args.paths, args.horizon_days, args.confidence, args.seed,
+                         args.workers, args.fund_value, **model)
+        print(f"{result.paths} paths, {result.horizon_days}-day horizon, book of {result.date:%Y-%m-%d} "
+              f"({result.unpriced_lots} unpriced lots left out)")
+        print(result.risk.round(ROUNDING).to_string(index=False))
+        if args.nav_history:
+            print("Historical VaR of one NAV period (weekly for fund_entries.py entries):")
+            print(historical_var(pd.read_csv(args.nav_history)['nav'], args.confidence).round(ROUNDING)
+                  .to_string(index=False))
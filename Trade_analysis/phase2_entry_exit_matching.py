@@ -1,102 +1,67 @@
+import argparse
 import pandas as pd
-import numpy as np
-from collections import defaultdict
+from lot_ledger import run_lot_ledger, compare_cost_basis, COST_BASIS_METHODS
 
-# Load the cleaned and parsed tradebook from Phase 1
-file_path = 'tradebook_phase1_cleaned.csv'
-trades = pd.read_csv(file_path, parse_dates=['trade_date', 'expiry_date', 'order_execution_time'])
 
-# Sort trades by execution time for correct sequencing
-trades = trades.sort_values('order_execution_time').reset_index(drop=True)
+def prepare_fills(trades):
+    """Execution-ordered fills with the position_key and signed net_qty the ledger matches on."""
+    trades = trades.copy()
+    for col in ['trade_date', 'expiry_date', 'order_execution_time']:
+        trades[col] = pd.to_datetime(trades[col])
 
-# Create a composite key for each position (underlying, expiry, strike, option_type)
-trades['position_key'] = trades.apply(
-    lambda row: f"{row['underlying']}_{row['expiry_date'].strftime('%Y-%m-%d')}_{row['strike']}_{row['option_type']}", 
-    axis=1
-)
+    # Sort trades by execution time for correct sequencing
+    trades = trades.sort_values('order_execution_time', kind='stable').reset_index(drop=True)
 
-# Map trade_type to quantity direction
-trades['net_qty'] = trades.apply(
-    lambda row: row['quantity'] * (1 if row['trade_type'].lower() == 'buy' else -1), 
-    axis=1
-)
+    # Create a composite key for each position (underlying, expiry, strike, option_type)
+    trades['position_key'] = (trades['underlying'].astype(str) + '_' + trades['expiry_date'].dt.strftime('%Y-%m-%d') +
+                              '_' + trades['strike'].astype(str) + '_' + trades['option_type'].astype(str))
 
-# Initialize columns for annotation
-trades['entry_exit'] = np.nan
-trades['matched_qty'] = 0
-trades['matched_trade_ids'] = None
+    # Map trade_type to quantity direction
+    trades['net_qty'] = trades['quantity'].where(trades['trade_type'].str.lower() == 'buy', -trades['quantity'])
+    return trades
 
-# Dictionary to track open positions using FIFO
-open_positions = defaultdict(list)
 
-for idx, row in trades.iterrows():
-    key = row['position_key']
-    trade_qty = row['net_qty']
-    price = row['price']
-    trade_id = row['trade_id']
-    
-    current_position = sum(lot['qty'] for lot in open_positions[key])
-    
-    # Determine if this trade is entry or exit
-    if (current_position == 0) or (current_position * trade_qty > 0):
-        # Entry (same direction or new position)
-        open_positions[key].append({'qty': trade_qty, 'price': price, 'trade_id': trade_id})
-        trades.at[idx, 'entry_exit'] = 'Entry'
-        trades.at[idx, 'matched_qty'] = abs(trade_qty)
-    else:
-        # Exit (opposite direction)
-        remaining_qty = abs(trade_qty)
-        matched = 0
-        matched_ids = []
-        
-        while remaining_qty > 0 and open_positions[key]:
-            current_lot = open_positions[key][0]
-            
-            # Calculate possible match
-            close_qty = min(remaining_qty, abs(current_lot['qty']))
-            
-            # Reduce both the lot and the exit trade
-            if current_lot['qty'] > 0:
-                # Closing long position with sell
-                current_lot['qty'] -= close_qty
-                matched += close_qty
-            else:
-                # Closing short position with buy
-                current_lot['qty'] += close_qty
-                matched += close_qty
-                
-            remaining_qty -= close_qty
-            matched_ids.append(str(current_lot['trade_id']))
-            
-            # Remove fully closed lots
-            if current_lot['qty'] == 0:
-                open_positions[key].pop(0)
-                
-        # Update trade status
-        if matched == 0:
-            trades.at[idx, 'entry_exit'] = 'Unmatched Exit'
-        elif matched == abs(trade_qty):
-            trades.at[idx, 'entry_exit'] = 'Exit'
-        else:
-            trades.at[idx, 'entry_exit'] = 'Partial Exit'
-            
-        trades.at[idx, 'matched_qty'] = matched
-        trades.at[idx, 'matched_trade_ids'] = ';'.join(matched_ids)
+def run_phase2(trades, method='fifo'):
+    """Phase 2: annotate Phase 1 trades with entry/exit matches. Returns (trades, LedgerResult)."""
+    trades = prepare_fills(trades)
 
-# Summary counts for audit
-entry_count = (trades['entry_exit'] == 'Entry').sum()
-exit_count = (trades['entry_exit'] == 'Exit').sum()
-partial_exit_count = (trades['entry_exit'] == 'Partial Exit').sum()
-unmatched_exit_count = (trades['entry_exit'] == 'Unmatched Exit').sum()
+    # Single ledger pass: trade annotations, lot lifecycle and realised P&L together
+    ledger = run_lot_ledger(trades, method=method)
+    trades[ledger.annotations.columns] = ledger.annotations
+    return trades, ledger
 
-print(f'''Matching Summary:
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Phase 2: match exits to open lots')
+    parser.add_argument('--method', choices=COST_BASIS_METHODS, default='fifo',
+                        help='Cost basis used to match exits and book realised P&L')
+    parser.add_argument('--compare', action='store_true',
+                        help='Also print realised P&L under every cost basis method')
+    args = parser.parse_args()
+
+    # Load the cleaned and parsed tradebook from Phase 1
+    file_path = 'tradebook_phase1_cleaned.csv'
+    trades, ledger = run_phase2(pd.read_csv(file_path), method=args.method)
+
+    # Summary counts for audit
+    entry_count = (trades['entry_exit'] == 'Entry').sum()
+    exit_count = (trades['entry_exit'] == 'Exit').sum()
+    partial_exit_count = (trades['entry_exit'] == 'Partial Exit').sum()
+
+    print(f'''Matching Summary:
 Entries: {entry_count}
 Full Exits: {exit_count}
 Partial Exits: {partial_exit_count}
-Unmatched Exits: {unmatched_exit_count}''')
+Lots opened: {len(ledger.lots)}''')
+
+    if args.compare:
+        print("\nRealised P&L by cost basis method:")
+        print(compare_cost_basis(trades).sum().round(2))
 
-# Save annotated trades
-trades.to_csv('tradebook_phase2_annotated.csv', index=False)
-print("\nSample trades:")
-print(trades[['trade_date', 'symbol', 'trade_type', 'quantity', 
-             'entry_exit', 'matched_qty', 'matched_trade_ids']].head(10))
+    # Save annotated trades
+    trades.to_csv('tradebook_phase2_annotated.csv', index=False)
+    ledger.lots.to_csv('phase2_lot_ledger.csv', index=False)
+    ledger.realised_pnl.to_csv('phase2_realised_pnl.csv', index=False)
+    print("\nSample trades:")
+    print(trades[['trade_date', 'symbol', 'trade_type', 'quantity',
+                 'entry_exit', 'matched_qty', 'matched_trade_ids']].head(10))
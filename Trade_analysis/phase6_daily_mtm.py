@@ -0,0 +1,132 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from candle_cache import CandleCache, CANDLE_DIR
+from phase1_data_preparation import run_phase1
+from phase2_entry_exit_matching import run_phase2
+from phase5_mtm_calculation import strategy_legs
+from position_book import PositionBook
+
+MTM_COLUMNS = ['date', 'lot_id', 'symbol', 'underlying', 'expiry', 'strike', 'option_type', 'direction',
+               'open_qty', 'cost_basis', 'close', 'price_date', 'unrealised_pnl']
+
+
+def value_lots(book, lots, realised_pnl, candles, max_stale_days=5):
+    """
+    Unrealised P&L of every lot open at each business day's close, one row per lot-day.
+
+    Lot-days come from the position book's intervals, with the remainder of partly
+    closed lots running on to expiry. Quantity still open is the lot's open quantity
+    less the chunks the ledger closed up to and including that day, so partial exits
+    shrink the valued quantity. On its expiry day a lot is settled (and
+    booked as realised by Phase 2), so it is not valued. Each lot-day takes the latest
+    close of its symbol at most `max_stale_days` old, with one merge_asof over all
+    lot-days; without one, close and unrealised_pnl are NaN.
+    """
+    rows, dates = book.lot_days(open_remainder=True)
+    lot_ids = book.intervals['lot_id'].to_numpy()[rows]
+    lot_info = lots.set_index('lot_id')
+    days = pd.DataFrame({'date': dates, 'lot_id': lot_ids})
+    days = days.join(lot_info[['symbol', 'underlying', 'expiry', 'strike', 'option_type', 'direction',
+                               'open_qty', 'cost_basis']], on='lot_id')
+    days['expiry'] = pd.to_datetime(days['expiry'])
+    days = days.sort_values('date', kind='stable')
+
+    # Quantity closed by each lot's exits, cumulative through each day
+    exits = realised_pnl[realised_pnl['event'] == 'exit']
+    closed = exits.assign(date=pd.to_datetime(exits['date'])).groupby(['lot_id', 'date'])['qty'].sum() \
+        .groupby(level='lot_id').cumsum().rename('closed_qty').reset_index().sort_values('date')
+    days = pd.merge_asof(days, closed, on='date', by='lot_id', direction='backward')
+    days['open_qty'] = days['open_qty'] - days['closed_qty'].fillna(0).astype(np.int64)
+    days = days[(days['open_qty'] > 0) & (days['date'] < days['expiry'])]
+
+    prices = candles[['symbol', 'date', 'close']].dropna().assign(price_date=lambda c: c['date']) \
+        .sort_values('date')
+    days = pd.merge_asof(days, prices, on='date', by='symbol', direction='backward',
+                         tolerance=pd.Timedelta(days=max_stale_days))
+    sign = np.where(days['direction'] == 'Long', 1, -1)
+    days['unrealised_pnl'] = (days['close'] - days['cost_basis']) * days['open_qty'] * sign
+    return days.sort_values(['date', 'lot_id'])[MTM_COLUMNS].reset_index(drop=True)
+
+
+def strategy_mtm(position_mtm, strategies):
+    """
+    Unrealised P&L per Phase 4 strategy row, attributed through the legs like Phase 5:
+    lot values summed by (date, strike, option_type) and joined to each leg. `unpriced_legs`
+    counts legs with an open lot but no close that day.
+    """
+    lots = position_mtm.assign(strike=np.trunc(pd.to_numeric(position_mtm['strike'], errors='coerce'))
+                               .astype('Int64'),
+                               unpriced=position_mtm['close'].isna())
+    by_key = lots.groupby(['date', 'strike', 'option_type']).agg(
+        unrealised_pnl=('unrealised_pnl', 'sum'), unpriced=('unpriced', 'any'))
+
+    strategies = strategies.reset_index(drop=True)
+    legs = strategy_legs(strategies).join(by_key, on=['date', 'strike', 'option_type'])
+    legs['unpriced'] = legs['unpriced'].eq(True)
+    per_row = legs.groupby(level=0).agg(unrealised_pnl=('unrealised_pnl', 'sum'), unpriced_legs=('unpriced', 'sum'))
+    per_row = per_row.reindex(strategies.index).fillna({'unrealised_pnl': 0.0, 'unpriced_legs': 0})
+
+    return pd.DataFrame({
+        'date': pd.to_datetime(strategies['date']),
+        'strategy_id': strategies['strategy_id'],
+        'strategy_type': strategies['strategy_type'],
+        'active_legs': strategies['legs'],
+        'unrealised_pnl': per_row['unrealised_pnl'].round(2),
+        'unpriced_legs': per_row['unpriced_legs'].astype(int),
+    })
+
+
+def run_phase6(lots, realised_pnl, strategies, candles, max_stale_days=5):
+    """Phase 6: daily mark-to-market of open lots at the close. Returns (position_mtm, strategy_mtm)."""
+    lots = lots.copy()
+    for col in ['expiry', 'open_date', 'close_date']:
+        lots[col] = pd.to_datetime(lots[col])
+    position_mtm = value_lots(PositionBook(lots), lots, realised_pnl, candles, max_stale_days)
+    return position_mtm, strategy_mtm(position_mtm, strategies)
+
+
+def check_partial_exit():
+    """
+    Regression check: a lot bought 100 on 2024-04-15 and half sold on 04-16 keeps its
+    other 50 valued every business day up to its 04-25 expiry. Raises AssertionError.
+    """
+    raw = pd.DataFrame({
+        'symbol': 'NIFTY24APR22300CE', 'trade_date': ['15-04-2024', '16-04-2024'], 'trade_type': ['buy', 'sell'],
+        'quantity': [100, 50], 'price': [100.0, 120.0], 'trade_id': [1, 2],
+        'order_execution_time': ['2024-04-15T10:00:00', '2024-04-16T10:00:00'], 'expiry_date': '25-04-2024',
+    })
+    _, ledger = run_phase2(run_phase1(raw))
+    dates = pd.bdate_range('2024-04-15', '2024-04-24')
+    candles = pd.DataFrame({'symbol': 'NIFTY24APR22300CE', 'date': dates, 'close': 110.0})
+    position_mtm = value_lots(PositionBook(ledger.lots), ledger.lots, ledger.realised_pnl, candles)
+    assert position_mtm['date'].tolist() == list(dates), position_mtm
+    assert position_mtm['open_qty'].tolist() == [100] + [50] * (len(dates) - 1), position_mtm
+    assert (position_mtm['unrealised_pnl'] == position_mtm['open_qty'] * 10.0).all(), position_mtm
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Phase 6: value open lots at each day\'s close from cached candles')
+    parser.add_argument('--candle-dir', default=CANDLE_DIR)
+    parser.add_argument('--max-stale-days', type=int, default=5,
+                        help='Oldest close (in days) used for a lot-day without a candle of its own')
+    parser.add_argument('--check', action='store_true', help='Run the partial exit regression check and exit')
+    args = parser.parse_args()
+    if args.check:
+        check_partial_exit()
+        print("Partial exit check passed")
+        raise SystemExit
+
+    lots = pd.read_csv('phase2_lot_ledger.csv')
+    candles = CandleCache(args.candle_dir).load(lots['symbol'].unique())
+    position_mtm, strategy_mtm_df = run_phase6(lots, pd.read_csv('phase2_realised_pnl.csv'),
+                                               pd.read_csv('phase4_daily_strategies.csv'), candles,
+                                               args.max_stale_days)
+    position_mtm.to_csv('phase6_position_mtm.csv', index=False)
+    strategy_mtm_df.to_csv('phase6_strategy_mtm.csv', index=False)
+
+    priced = position_mtm['close'].notna()
+    print(f"Valued {priced.sum()}/{len(position_mtm)} open lot-days from {candles['symbol'].nunique()} cached symbols")
+    print(position_mtm.groupby('date')['unrealised_pnl'].sum().round(2).tail(10))
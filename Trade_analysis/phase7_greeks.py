@@ -0,0 +1,110 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from black_scholes import implied_vol, greeks, RISK_FREE_RATE
+from candle_cache import CandleCache, CANDLE_DIR
+from phase4_strategy_identification import STRATEGIES_FILE
+from phase5_mtm_calculation import strategy_legs
+
+GREEK_COLUMNS = ['delta', 'gamma', 'theta', 'vega']
+LOT_GREEK_COLUMNS = ['date', 'lot_id', 'symbol', 'underlying', 'expiry', 'strike', 'option_type', 'position_qty',
+                     'spot', 'close', 'iv'] + GREEK_COLUMNS
+# Read by the scenario grid, Monte Carlo VaR and /api/scenarios/book
+LOT_GREEKS_FILE = 'phase7_lot_greeks.csv'
+
+
+def load_underlying_prices(path=None, cache_dir=CANDLE_DIR, underlyings=None):
+    """
+    Daily underlying closes as (underlying, date, close): from a CSV with date, close and
+    an underlying (or symbol) column, or else from the candle cache, where an index's
+    candles are stored under the underlying's name (e.g. NIFTY.csv). By default every
+    cached symbol that is not an option contract is read.
+    """
+    if path:
+        prices = pd.read_csv(path)
+        prices.columns = [col.strip().lower() for col in prices.columns]
+        prices = prices.rename(columns={'symbol': 'underlying'})
+    else:
+        cache = CandleCache(cache_dir)
+        if underlyings is None:
+            underlyings = [symbol for symbol in cache.symbols() if not symbol.endswith(('CE', 'PE'))]
+        prices = cache.load(underlyings).rename(columns={'symbol': 'underlying'})
+    prices['date'] = pd.to_datetime(prices['date']).dt.normalize()
+    return prices[['underlying', 'date', 'close']].dropna()
+
+
+def lot_greeks(position_mtm, underlying_prices, rate=RISK_FREE_RATE, max_stale_days=5):
+    """
+    Implied vol and position greeks of every valued lot-day from Phase 6, in one batch.
+
+    Each lot-day takes its underlying's latest close at most `max_stale_days` old; time
+    to expiry is in calendar days over 365 from one close to the expiry-day close. IV
+    is solved from the lot's option close, and greeks (delta in units of the
+    underlying, theta per day, vega per vol point) are scaled by the signed open
+    quantity. Lot-days without an option or underlying price get NaN.
+    """
+    lots = position_mtm.sort_values('date', kind='stable')
+    spots = underlying_prices.rename(columns={'close': 'spot'}).sort_values('date')
+    lots = pd.merge_asof(lots, spots, on='date', by='underlying', direction='backward',
+                         tolerance=pd.Timedelta(days=max_stale_days))
+
+    t = (pd.to_datetime(lots['expiry']) - lots['date']).dt.days.to_numpy() / 365.0
+    strike = pd.to_numeric(lots['strike']).to_numpy(dtype=float)
+    is_call = (lots['option_type'] == 'CE').to_numpy()
+    spot = lots['spot'].to_numpy(dtype=float)
+    iv = implied_vol(lots['close'].to_numpy(dtype=float), spot, strike, t, is_call, rate)
+    unit = greeks(spot, strike, t, iv, is_call, rate)
+
+    qty = np.where(lots['direction'] == 'Long', 1, -1) * lots['open_qty'].to_numpy()
+    lots = lots.assign(position_qty=qty, iv=iv, **{name: unit[name] * qty for name in GREEK_COLUMNS})
+    return lots.sort_values(['date', 'lot_id'])[LOT_GREEK_COLUMNS].reset_index(drop=True)
+
+
+def underlying_greeks(lot_greeks_df):
+    """Net greeks per (date, underlying); `unpriced_lots` counts lot-days left out for want of a price."""
+    lots = lot_greeks_df.assign(unpriced_lots=lot_greeks_df['iv'].isna())
+    return lots.groupby(['date', 'underlying'])[GREEK_COLUMNS + ['unpriced_lots']].sum().reset_index()
+
+
+def strategy_greeks(lot_greeks_df, strategies):
+    """Net greeks per Phase 4 strategy row, attributed through the legs like Phases 5 and 6."""
+    lots = lot_greeks_df.assign(strike=np.trunc(pd.to_numeric(lot_greeks_df['strike'], errors='coerce'))
+                                .astype('Int64'))
+    by_key = lots.groupby(['date', 'strike', 'option_type'])[GREEK_COLUMNS].sum()
+
+    strategies = strategies.reset_index(drop=True)
+    legs = strategy_legs(strategies).join(by_key, on=['date', 'strike', 'option_type'])
+    per_row = legs.groupby(level=0)[GREEK_COLUMNS].sum().reindex(strategies.index, fill_value=0.0)
+    return pd.concat([pd.DataFrame({
+        'date': pd.to_datetime(strategies['date']),
+        'strategy_id': strategies['strategy_id'],
+        'strategy_type': strategies['strategy_type'],
+    }), per_row], axis=1)
+
+
+def run_phase7(position_mtm, strategies, underlying_prices, rate=RISK_FREE_RATE, max_stale_days=5):
+    """Phase 7: greeks of the open book. Returns (lot_greeks, strategy_greeks, underlying_greeks)."""
+    lots = lot_greeks(position_mtm, underlying_prices, rate, max_stale_days)
+    return lots, strategy_greeks(lots, strategies), underlying_greeks(lots)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Phase 7: implied vol and greeks of every open lot')
+    parser.add_argument('--underlying-prices', default=None,
+                        help='CSV of underlying closes (date, underlying, close); default: the candle cache')
+    parser.add_argument('--candle-dir', default=CANDLE_DIR)
+    parser.add_argument('--rate', type=float, default=RISK_FREE_RATE, help='Annualised risk-free rate')
+    args = parser.parse_args()
+
+    position_mtm = pd.read_csv('phase6_position_mtm.csv', parse_dates=['date', 'expiry'])
+    prices = load_underlying_prices(args.underlying_prices, args.candle_dir, position_mtm['underlying'].unique())
+    lots, by_strategy, by_underlying = run_phase7(position_mtm, pd.read_csv(STRATEGIES_FILE), prices,
+                                                  args.rate)
+    lots.to_csv(LOT_GREEKS_FILE, index=False)
+    by_strategy.to_csv('phase7_strategy_greeks.csv', index=False)
+    by_underlying.to_csv('phase7_underlying_greeks.csv', index=False)
+
+    print(f"Greeks for {lots['iv'].notna().sum()}/{len(lots)} open lot-days")
+    print(by_underlying.tail(10).round(2))
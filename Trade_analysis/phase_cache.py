@@ -0,0 +1,65 @@
+import hashlib
+import os
+
+import pandas as pd
+
+from expiry_calendar import CACHE_DIR
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+PHASE_CACHE_DIR = os.path.join(CACHE_DIR, 'phases')
+
+
+def frame_digest(df):
+    """Content hash of a DataFrame: columns, dtypes and every value, index included."""
+    digest = hashlib.sha1(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def source_digest(paths):
+    """Hash of the source files (relative to this directory) a phase's output depends on."""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(os.path.join(MODULE_DIR, path), 'rb') as f:
+            digest.update(path.encode() + b'\0' + f.read())
+    return digest.hexdigest()
+
+
+class PhaseCache:
+    """
+    On-disk cache of phase outputs keyed by content, not by file names or timestamps.
+
+    A phase's key hashes its input DataFrames, the source of the modules it runs and
+    its config, so a rerun reloads a phase whose inputs and code are unchanged and
+    recomputes the rest. Outputs are pickled, which round-trips them exactly.
+    `report` lists (phase, 'hit' | 'miss', key) in run order.
+    """
+
+    def __init__(self, cache_dir=PHASE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.report = []
+
+    def key(self, phase, inputs, sources=(), config=()):
+        digest = hashlib.sha1(phase.encode())
+        for df in inputs:
+            digest.update(frame_digest(df).encode())
+        digest.update(source_digest(sources).encode())
+        digest.update(repr(config).encode())
+        return digest.hexdigest()[:16]
+
+    def run(self, phase, compute, inputs, sources=(), config=()):
+        """Cached result of `compute()`, whose output depends only on `inputs`, `sources` and `config`."""
+        key = self.key(phase, inputs, sources, config)
+        path = os.path.join(self.cache_dir, f'{phase}_{key}.pkl')
+        if os.path.exists(path):
+            self.report.append((phase, 'hit', key))
+            return pd.read_pickle(path)
+
+        result = compute()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        pd.to_pickle(result, path)
+        self.report.append((phase, 'miss', key))
+        return result
+
+    def summary(self):
+        return '\n'.join(f"{phase}: {status} ({key})" for phase, status, key in self.report)
@@ -0,0 +1,297 @@
+import argparse
+import os
+from collections import namedtuple
+
+import pandas as pd
+
+from lot_ledger import COST_BASIS_METHODS
+from phase1_data_preparation import run_phase1
+from phase2_entry_exit_matching import run_phase2
+from phase3_daily_position_book import run_phase3
+from phase4_strategy_identification import run_phase4, make_detector, STRATEGIES_FILE
+from phase5_mtm_calculation import run_phase5
+from phase6_daily_mtm import run_phase6
+from phase7_greeks import run_phase7, load_underlying_prices, LOT_GREEKS_FILE
+from candle_cache import CandleCache, CANDLE_DIR
+from phase_cache import PhaseCache, PHASE_CACHE_DIR
+from ingest import ingest_tradebook
+from incremental import STATE_PATH, build_state, append_fills, save_state, load_state
+from instrumentation import RunReport
+
+CHECKPOINT_FORMATS = ('parquet', 'feather')
+
+# Modules whose code determines each phase's output; part of the phase cache key
+PHASE_SOURCES = {
+    'phase1': ['phase1_data_preparation.py', 'symbol_parser.py', 'expiry_calendar.py'],
+    'phase2': ['phase2_entry_exit_matching.py', 'lot_ledger.py'],
+    'phase3': ['phase3_daily_position_book.py', 'position_book.py'],
+    'phase4': ['phase4_strategy_identification.py', 'strategy_detection.py', 'strategy_templates.py'],
+    'phase5': ['phase5_mtm_calculation.py'],
+    'phase6': ['phase6_daily_mtm.py', 'phase5_mtm_calculation.py', 'position_book.py'],
+    'phase7': ['phase7_greeks.py', 'black_scholes.py', 'phase5_mtm_calculation.py'],
+}
+
+# MTM outputs are only set when the run is given candles, greeks when also given underlying prices
+PipelineResult = namedtuple('PipelineResult', [
+    'trades', 'annotated', 'lots', 'realised_pnl', 'intervals', 'daily_positions', 'strategies', 'strategy_pnl',
+    'position_mtm', 'strategy_mtm', 'lot_greeks', 'strategy_greeks', 'underlying_greeks'],
+    defaults=(None,) * 5)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as exc:
+        raise ImportError("Parquet/Feather checkpoints need pyarrow: pip install pyarrow") from exc
+
+
+def _typed(df):
+    # Arrow needs one type per column; object columns mixing types (e.g. calendar
+    # spread expiries next to Timestamps) are stored as strings, nulls kept
+    df = df.reset_index(drop=True)
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].dropna()
+        if not values.map(type).eq(str).all():
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+
+def write_checkpoint(df, checkpoint_dir, name, fmt='parquet'):
+    """Write one phase output as a typed Parquet/Feather file; returns its path."""
+    path = os.path.join(checkpoint_dir, f'{name}.{fmt}')
+    if fmt == 'parquet':
+        _typed(df).to_parquet(path, index=False)
+    else:
+        _typed(df).to_feather(path)
+    return path
+
+
+def read_checkpoint(checkpoint_dir, name, fmt='parquet'):
+    path = os.path.join(checkpoint_dir, f'{name}.{fmt}')
+    return pd.read_parquet(path) if fmt == 'parquet' else pd.read_feather(path)
+
+
+def _run_phase(cache, phase, compute, inputs, config=(), extra_sources=(), report=None, rows_out=len):
+    if cache is not None:
+        cached = compute
+        compute = lambda: cache.run(phase, cached, inputs, PHASE_SOURCES[phase] + list(extra_sources), config)
+    if report is None:
+        return compute()
+    return report.track(phase, compute, sum(len(df) for df in inputs), rows_out)
+
+
+def run_pipeline(trades, method='fifo', templates=None, workers=1, checkpoint_dir=None, checkpoint_format='parquet',
+                 cache=None, cleaned=False, report=None, candles=None, underlying_prices=None):
+    """
+    Run phases 1-5 on a raw tradebook DataFrame, passing each phase's output to the
+    next in memory. With `checkpoint_dir`, every phase output is also written there
+    as Parquet or Feather (requires pyarrow). With a PhaseCache, phases whose inputs,
+    code and config are unchanged are reloaded instead of recomputed; `cache.report`
+    records hits and misses. `cleaned` marks `trades` as Phase 1 output already (e.g.
+    from ingest_tradebook). With a RunReport, every phase's time, rows and memory are
+    recorded in `report`. With `candles` (see CandleCache.load), Phase 6 also values
+    open lots at each day's close, and with `underlying_prices` too, Phase 7 adds their
+    implied vols and greeks. Returns a PipelineResult.
+    """
+    if checkpoint_format not in CHECKPOINT_FORMATS:
+        raise ValueError(f"Unknown checkpoint format '{checkpoint_format}', expected one of {CHECKPOINT_FORMATS}")
+    if checkpoint_dir:
+        _require_pyarrow()
+
+    # Phase 1: Data Preparation
+    if not cleaned:
+        raw = trades
+        trades = _run_phase(cache, 'phase1', lambda: run_phase1(raw), [raw], report=report)
+
+    # Phase 2: Entry/Exit Matching
+    annotated, ledger = _run_phase(cache, 'phase2', lambda: run_phase2(trades, method=method), [trades],
+                                   config=(method,), report=report, rows_out=lambda out: len(out[1].lots))
+
+    # Phase 3: Daily position book
+    book, daily_positions = _run_phase(cache, 'phase3', lambda: run_phase3(ledger.lots), [ledger.lots],
+                                       report=report, rows_out=lambda out: len(out[1]))
+
+    # Phase 4: Strategy Identification (worker count does not change the output)
+    strategies = _run_phase(cache, 'phase4',
+                            lambda: run_phase4(daily_positions, make_detector(templates), workers=workers),
+                            [daily_positions], config=(templates is not None,),
+                            extra_sources=[os.path.abspath(templates)] if templates else [], report=report)
+
+    # Phase 5: Realised P&L per strategy
+    strategy_pnl = _run_phase(cache, 'phase5', lambda: run_phase5(ledger.realised_pnl, strategies),
+                              [ledger.realised_pnl, strategies], report=report)
+
+    result = PipelineResult(trades, annotated, ledger.lots, ledger.realised_pnl, book.intervals,
+                            daily_positions, strategies, strategy_pnl)
+    if candles is not None:
+        result = with_mtm(result, candles, cache, report)
+        if underlying_prices is not None:
+            result = with_greeks(result, underlying_prices, cache, report)
+    if checkpoint_dir:
+        write_checkpoints(result, checkpoint_dir, checkpoint_format)
+    return result
+
+
+def with_mtm(result, candles, cache=None, report=None):
+    """`result` with Phase 6 (daily mark-to-market of open lots) filled in from `candles`."""
+    candles = candles[candles['symbol'].isin(result.lots['symbol'])].reset_index(drop=True)
+    inputs = [result.lots, result.realised_pnl, result.strategies, candles]
+    position_mtm, strategy_mtm = _run_phase(
+        cache, 'phase6', lambda: run_phase6(result.lots, result.realised_pnl, result.strategies, candles), inputs,
+        report=report, rows_out=lambda out: len(out[0]))
+    return result._replace(position_mtm=position_mtm, strategy_mtm=strategy_mtm)
+
+
+def with_greeks(result, underlying_prices, cache=None, report=None):
+    """`result` (with Phase 6 done) with Phase 7 greeks filled in."""
+    prices = underlying_prices[underlying_prices['underlying'].isin(result.position_mtm['underlying'])] \
+        .reset_index(drop=True)
+    lot_greeks, strategy_greeks, underlying_greeks = _run_phase(
+        cache, 'phase7', lambda: run_phase7(result.position_mtm, result.strategies, prices),
+        [result.position_mtm, result.strategies, prices], report=report, rows_out=lambda out: len(out[0]))
+    return result._replace(lot_greeks=lot_greeks, strategy_greeks=strategy_greeks,
+                           underlying_greeks=underlying_greeks)
+
+
+def write_checkpoints(result, checkpoint_dir, fmt='parquet'):
+    _require_pyarrow()
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    for name, df in result._asdict().items():
+        if df is not None:
+            write_checkpoint(df, checkpoint_dir, name, fmt)
+
+
+def state_result(state):
+    """PipelineResult view of an incremental PipelineState."""
+    return PipelineResult(state.trades, state.annotated, state.lots, state.realised_pnl, state.book.intervals,
+                          state.daily_positions, state.strategies, state.strategy_pnl)
+
+
+def main():
+    """
+    Runs all phases of the trade analysis workflow sequentially.
+    """
+    parser = argparse.ArgumentParser(description='Run the trade analysis pipeline end to end in memory')
+    parser.add_argument('tradebook', nargs='?', default='tradebook-KG2302-FO-last-FY.csv')
+    parser.add_argument('--output', default='strategy_pnl_booked.csv', help='CSV for realised P&L per strategy')
+    parser.add_argument('--method', choices=COST_BASIS_METHODS, default='fifo',
+                        help='Cost basis used to match exits and book realised P&L')
+    parser.add_argument('--templates', nargs='?', const='option_strategies_legs.csv', default=None,
+                        help='Recognize strategies from a leg template table instead of the built-in shapes')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes for built-in strategy detection')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='Also write every phase output to this directory')
+    parser.add_argument('--checkpoint-format', choices=CHECKPOINT_FORMATS, default='parquet')
+    parser.add_argument('--cache', action='store_true',
+                        help='Reuse phase outputs whose inputs, code and config are unchanged')
+    parser.add_argument('--cache-dir', default=PHASE_CACHE_DIR)
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream the tradebook in chunks of this many rows with compact dtypes')
+    parser.add_argument('--state', nargs='?', const=STATE_PATH, default=None,
+                        help='Persist the lot ledger and phase outputs here for later --append runs')
+    parser.add_argument('--append', action='store_true',
+                        help='Apply the tradebook as new fills to --state (method and templates come from the state)')
+    parser.add_argument('--mtm', nargs='?', const='strategy_mtm_daily.csv', default=None,
+                        help='Value open lots at each close from the candle cache and save MTM per strategy here')
+    parser.add_argument('--candle-dir', default=CANDLE_DIR)
+    parser.add_argument('--greeks', nargs='?', const='underlying_greeks_daily.csv', default=None,
+                        help='With --mtm, also compute IV and greeks of open lots and save them per underlying here; '
+                             f'open lots and strategies also go to {LOT_GREEKS_FILE} and {STRATEGIES_FILE}')
+    parser.add_argument('--underlying-prices', default=None,
+                        help='CSV of underlying closes for --greeks (default: the candle cache)')
+    parser.add_argument('--report', nargs='?', const='pipeline_run_report.json', default=None,
+                        help='Write per-phase wall/CPU time, rows, throughput and peak RSS to this JSON file')
+    parser.add_argument('--profile', nargs='?', const='pipeline_slowest_phase.prof', default=None,
+                        help='Profile every phase and dump the slowest one to this cProfile file')
+    args = parser.parse_args()
+    if args.workers > 1 and args.templates:
+        parser.error('--workers applies to the built-in detector only')
+    if args.append and not args.state:
+        parser.error('--append needs --state')
+    if args.state and args.cache:
+        parser.error('--cache cannot be combined with --state')
+    if args.chunksize and args.state:
+        parser.error('--chunksize cannot be combined with --state')
+    if args.greeks and not args.mtm:
+        parser.error('--greeks needs --mtm')
+
+    cache = PhaseCache(args.cache_dir) if args.cache else None
+    report = RunReport(profile=bool(args.profile)) if args.report or args.profile else None
+    candles = CandleCache(args.candle_dir).load() if args.mtm else None
+    underlying_prices = load_underlying_prices(args.underlying_prices, args.candle_dir) if args.greeks else None
+    if args.state:
+        raw = pd.read_csv(args.tradebook)
+        if args.append:
+            state = load_state(args.state)
+            update = lambda: append_fills(state, raw, workers=args.workers)
+            stats = update() if report is None else report.track('append', update, len(raw), lambda s: s['fills'])
+        else:
+            build = lambda: build_state(raw, method=args.method, templates=args.templates, workers=args.workers)
+            state = build() if report is None else report.track('build', build, len(raw), lambda s: len(s.annotated))
+            stats = None
+        save_state(state, args.state)
+        result = state_result(state)
+        if candles is not None:
+            result = with_mtm(result, candles, report=report)
+        if underlying_prices is not None:
+            result = with_greeks(result, underlying_prices, report=report)
+        if args.checkpoint_dir:
+            write_checkpoints(result, args.checkpoint_dir, args.checkpoint_format)
+    elif args.chunksize:
+        ingest = lambda: ingest_tradebook(args.tradebook, args.chunksize, track_memory=True)
+        trades, ingest_stats = (ingest() if report is None else
+                                report.track('ingest', ingest, rows_out=lambda out: len(out[0])))
+        print(f"Ingested {ingest_stats['rows_kept']}/{ingest_stats['rows_read']} rows in {ingest_stats['chunks']} chunks: "
+              f"{ingest_stats['frame_bytes'] / 2**20:.1f} MiB in memory, "
+              f"{ingest_stats['peak_bytes'] / 2**20:.1f} MiB peak while reading")
+        result = run_pipeline(trades, method=args.method, templates=args.templates,
+                              workers=args.workers, checkpoint_dir=args.checkpoint_dir,
+                              checkpoint_format=args.checkpoint_format, cache=cache, cleaned=True, report=report,
+                              candles=candles, underlying_prices=underlying_prices)
+    else:
+        result = run_pipeline(pd.read_csv(args.tradebook), method=args.method, templates=args.templates,
+                              workers=args.workers, checkpoint_dir=args.checkpoint_dir,
+                              checkpoint_format=args.checkpoint_format, cache=cache, report=report,
+                              candles=candles, underlying_prices=underlying_prices)
+    result.strategy_pnl.to_csv(args.output, index=False)
+
+    print(f"{len(result.trades)} trades, {len(result.lots)} lots, {len(result.strategies)} strategy-days")
+    if args.state:
+        print(f"State saved to {args.state}")
+    if args.append:
+        print(f"Appended {stats['fills']} fills{' (ledger replayed: fills before the last run)' if stats['replayed'] else ''}: "
+              f"{stats['lots_updated']} lots updated, strategies re-detected on {stats['dates_detected']} dates, "
+              f"P&L re-attributed on {stats['dates_attributed']} dates")
+    if cache:
+        print("Phase cache:")
+        print(cache.summary())
+    if args.checkpoint_dir:
+        print(f"Checkpoints written to {args.checkpoint_dir} as {args.checkpoint_format}")
+    if args.mtm:
+        result.strategy_mtm.to_csv(args.mtm, index=False)
+        priced = result.position_mtm['close'].notna()
+        print(f"Marked {priced.sum()}/{len(priced)} open lot-days to market; "
+              f"unrealised P&L per strategy saved to {args.mtm}")
+    if args.greeks:
+        result.underlying_greeks.to_csv(args.greeks, index=False)
+        # Inputs of the scenario grid, Monte Carlo VaR and /api/scenarios/book
+        result.lot_greeks.to_csv(LOT_GREEKS_FILE, index=False)
+        result.strategies.to_csv(STRATEGIES_FILE, index=False)
+        print(f"Greeks for {result.lot_greeks['iv'].notna().sum()}/{len(result.lot_greeks)} open lot-days; "
+              f"net greeks per underlying saved to {args.greeks}, open lots to {LOT_GREEKS_FILE} "
+              f"and strategies to {STRATEGIES_FILE}")
+    if report:
+        print("Run report:")
+        print(report.summary())
+        if args.report:
+            print(f"Run report written to {report.write(args.report)}")
+        if args.profile:
+            slowest = report.dump_profile(args.profile)
+            print(f"Profile of the slowest phase ({slowest}) written to {args.profile}" if slowest else
+                  f"No phase ran; empty profile written to {args.profile}")
+    print(f"\nWorkflow completed. Realised P&L per strategy saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+BOOK_COLUMNS = ['date', 'underlying', 'expiry', 'strike', 'option_type', 'quantity',
+                'position_type', 'avg_entry_price', 'status']
+
+
+class PositionBook:
+    """
+    Daily position book stored as one interval per lot instead of one row per lot per day.
+
+    A lot is held on every business day from its open date to the earlier of its
+    (last) close date and its expiry; a lot the ledger left partly open is held by the
+    book until that last partial close, but `lot_days` can run its open remainder on
+    to expiry. For point and window queries the intervals are
+    sorted by start and cut into blocks of about sqrt(lots), each ordered latest end
+    first, so a query is one vectorized search per block plus its output instead of a
+    scan of every interval. The dense per-day table is only materialised by `daily()`.
+    """
+
+    def __init__(self, lots):
+        lots = lots[lots['expiry'].notna()]
+        end = lots['close_date'].fillna(lots['expiry'])
+        end = end.where(end < lots['expiry'], lots['expiry'])
+        # What a partial exit leaves open is held to expiry
+        self._remainder_end = np.where(lots['remaining_qty'].to_numpy() > 0, lots['expiry'].to_numpy(),
+                                       end.to_numpy()).astype('datetime64[ns]')
+
+        self.intervals = pd.DataFrame({
+            'lot_id': lots['lot_id'].to_numpy(),
+            'start': lots['open_date'].to_numpy(),
+            'end': end.to_numpy(),
+            'close_date': lots['close_date'].to_numpy(),
+            'underlying': lots['underlying'].to_numpy(),
+            'expiry': lots['expiry'].to_numpy(),
+            'strike': _strike_column(lots['strike']),
+            'option_type': lots['option_type'].to_numpy(),
+            'quantity': np.where(lots['direction'] == 'Long', lots['open_qty'], -lots['open_qty']),
+            'position_type': lots['direction'].to_numpy(),
+            'avg_entry_price': lots['open_price'].to_numpy(),
+        })
+
+        starts = self.intervals['start'].to_numpy().astype('datetime64[ns]')
+        ends = self.intervals['end'].to_numpy().astype('datetime64[ns]')
+        n = len(starts)
+        block_size = max(int(np.sqrt(n)), 1)
+        block = np.empty(n, dtype=np.int64)
+        by_start = np.argsort(starts, kind='stable')
+        block[by_start] = np.arange(n) // block_size
+        # End dates as ranks, so (block, end) packs into one sorted integer key
+        self._end_dates, end_rank = np.unique(ends, return_inverse=True)
+        self._lookup = np.lexsort((-end_rank, block))
+        self._lookup_keys = block[self._lookup] * (len(self._end_dates) + 1) + \
+            (len(self._end_dates) - end_rank[self._lookup])
+        self._block_starts = np.searchsorted(block[self._lookup], np.arange(block[by_start[-1]] + 2 if n else 1))
+        self._block_first = starts[by_start[::block_size]]
+
+    @property
+    def first_date(self):
+        return self.intervals['start'].min()
+
+    @property
+    def last_date(self):
+        return self.intervals['end'].max()
+
+    def as_of(self, date):
+        """Lots held on `date`, one row each, in the daily book's columns."""
+        date = pd.Timestamp(date)
+        held = self.intervals.iloc[self._overlapping(date, date)]
+        return self._book_rows(held, np.full(len(held), date, dtype='datetime64[ns]'))
+
+    def between(self, start, end):
+        """Lot intervals overlapping [start, end]."""
+        return self.intervals.iloc[self._overlapping(pd.Timestamp(start), pd.Timestamp(end))]
+
+    def _overlapping(self, first, last):
+        # Positions of the intervals with start <= last and end >= first, in interval order
+        first, last = np.datetime64(first, 'ns'), np.datetime64(last, 'ns')
+        blocks = np.searchsorted(self._block_first, last, side='right')
+        starts = self._block_starts[:blocks]
+        # Keys of ends >= first sort at or below this one within each block
+        rank = np.searchsorted(self._end_dates, first, side='left')
+        count = np.searchsorted(self._lookup_keys, np.arange(blocks) * (len(self._end_dates) + 1) +
+                                len(self._end_dates) - rank, side='right') - starts
+        offsets = np.cumsum(count) - count
+        rows = np.sort(self._lookup[np.repeat(starts, count) + np.arange(count.sum()) - np.repeat(offsets, count)])
+        # Only the last block can hold intervals starting after `last`
+        return rows[self.intervals['start'].to_numpy()[rows] <= last]
+
+    def lot_days(self, start=None, end=None, open_remainder=False):
+        """
+        One entry per lot per business day held, optionally clipped to [start, end]:
+        (positions into `intervals`, dates). With `open_remainder`, lots with quantity
+        still open run to expiry instead of stopping at their last partial close. Built
+        with a single repeat over the intervals rather than a date_range per lot.
+        """
+        intervals = self.intervals
+        first = intervals['start'].to_numpy().astype('datetime64[D]')
+        last = (self._remainder_end if open_remainder else intervals['end'].to_numpy()).astype('datetime64[D]')
+        if start is not None:
+            first = np.maximum(first, np.datetime64(pd.Timestamp(start).date()))
+        if end is not None:
+            last = np.minimum(last, np.datetime64(pd.Timestamp(end).date()))
+
+        days = np.maximum(np.busday_count(first, last + 1), 0)
+        rows = np.repeat(np.arange(len(intervals)), days)
+        # Business-day offset of each row within its own interval
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(days) - days, days)
+        dates = np.busday_offset(first[rows], offsets, roll='forward').astype('datetime64[ns]')
+        return rows, dates
+
+    def daily(self, start=None, end=None):
+        """Dense book with one row per lot per business day, optionally clipped to [start, end]."""
+        rows, dates = self.lot_days(start, end)
+        book = self._book_rows(self.intervals.iloc[rows], dates)
+        return book.sort_values(['date', 'underlying', 'expiry', 'strike', 'option_type'])
+
+    @staticmethod
+    def _book_rows(held, dates):
+        dates = pd.DatetimeIndex(dates)
+        expiry = pd.DatetimeIndex(held['expiry'])
+        close_date = pd.DatetimeIndex(held['close_date'])
+        expired = (dates == expiry) & (close_date.isna() | (close_date > expiry))
+        closed = close_date.notna() & (dates == close_date)
+
+        book = pd.DataFrame({
+            'date': dates,
+            'underlying': held['underlying'].to_numpy(),
+            'expiry': expiry.strftime('%Y-%m-%d %H:%M:%S'),
+            'strike': held['strike'].to_numpy(),
+            'option_type': held['option_type'].to_numpy(),
+            'quantity': held['quantity'].to_numpy(),
+            'position_type': held['position_type'].to_numpy(),
+            'avg_entry_price': held['avg_entry_price'].to_numpy(),
+            'status': np.select([expired, closed], ['Expired', 'Closed'], 'Active'),
+        })
+        return book[BOOK_COLUMNS]
+
+
+def _strike_column(strike):
+    # Whole-number strikes, kept as float only when some are missing (unparsed symbols)
+    strike = pd.to_numeric(strike, errors='coerce')
+    return strike.to_numpy() if strike.isna().any() else strike.astype('int64').to_numpy()
@@ -0,0 +1,134 @@
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+from expiry_calendar import resolve_expiries
+from symbol_parser import parse_symbols
+
+
+def symbol_expiries(trades, symbols):
+    """
+    Expiry of each of `symbols` (the distinct symbols of `trades`, in first-traded order),
+    resolved as in phase 1: the NSE calendar, the tradebook's expiry_date column, then
+    the date a weekly symbol carries; NaT if none.
+    """
+    parsed = parse_symbols(pd.Series(symbols, dtype=object))
+    expiry = resolve_expiries(parsed)
+    if 'expiry_date' in trades:
+        listed = trades['expiry_date'].groupby(pd.factorize(trades['symbol'])[0]).first().reindex(range(len(symbols)))
+        if not pd.api.types.is_datetime64_any_dtype(listed):
+            listed = pd.to_datetime(listed, format='%d-%m-%Y', errors='coerce')
+        expiry = expiry.fillna(pd.Series(listed.to_numpy(), index=expiry.index))
+    return expiry.fillna(parsed['parsed_expiry_date']).to_numpy().astype('datetime64[ns]')
+
+
+class PositionTimeline:
+    """
+    Event-sourced FIFO positions per symbol, queryable as of any time.
+
+    Each trade is stored once as a delta (time, symbol, signed quantity, price) in
+    columnar arrays. FIFO makes a symbol's open lots a function of two running totals:
+    lot i covers bought quantity [start_i, end_i) and is open while the symbol's
+    closed total is below end_i. Both totals come from grouped cumulative sums, which
+    also give the trade that closes each lot. A contract is settled at expiry, so its
+    lots are open through its expiry day and closed after it, the same rule as
+    daily_strategies_report.end_of_day_positions. Each lot is stored once, bucketed by the block of
+    `block_size` trades that opened it and ordered within the block by how long it
+    stays open. `as_of(t)` bisects the trade times and takes, from each block so far,
+    the prefix still open with one vectorized search, then reads the remaining
+    quantities off the closed totals; memory is linear in fills and no queue is
+    copied or replayed.
+    """
+
+    def __init__(self, trades, block_size=256):
+        trades = trades.sort_values('order_execution_time', kind='stable')
+        self.block_size = block_size
+        self.times = pd.to_datetime(trades['order_execution_time']).to_numpy().astype('datetime64[ns]')
+        self._time_list = self.times.tolist()
+        codes, self.symbols = pd.factorize(trades['symbol'])
+        self.codes = codes.astype(np.int32)
+        buy = trades['trade_type'].str.lower().to_numpy() == 'buy'
+        sell = trades['trade_type'].str.lower().to_numpy() == 'sell'
+        qty = trades['quantity'].to_numpy(dtype=np.int64)
+        # Trades that are neither buy nor sell leave positions unchanged
+        self.deltas = np.where(buy, qty, np.where(sell, -qty, 0))
+        self.prices = trades['price'].to_numpy(dtype=float)
+        self.expiries = symbol_expiries(trades, self.symbols)
+
+        # Bought and closed totals of the trade's symbol after each trade. Sells beyond the
+        # open quantity close nothing, so closed is sold less the largest shortfall so far
+        n = len(self.times)
+        bought = pd.Series(np.maximum(self.deltas, 0)).groupby(codes).cumsum().to_numpy()
+        sold = pd.Series(np.maximum(-self.deltas, 0)).groupby(codes).cumsum().to_numpy()
+        shortfall = pd.Series(sold - bought).groupby(codes).cummax().clip(lower=0).to_numpy()
+        self._closed = sold - shortfall
+
+        # Trades ordered by symbol, then time; keys stay sorted for searchsorted lookups
+        self._by_symbol = np.argsort(codes, kind='stable')
+        self._trade_keys = codes[self._by_symbol].astype(np.int64) * (n + 1) + self._by_symbol
+
+        # Lots: one per buy, covering bought quantity [start, end) of its symbol
+        self.lot_trades = np.flatnonzero(self.deltas > 0)
+        self.lot_ends = bought[self.lot_trades]
+        self.lot_starts = self.lot_ends - self.deltas[self.lot_trades]
+        lot_codes = codes[self.lot_trades].astype(np.int64)
+
+        # Closing trade of each lot: the symbol's first trade whose closed total reaches end
+        scale = int(bought.max()) + 1 if n else 1
+        closed_keys = codes[self._by_symbol].astype(np.int64) * scale + self._closed[self._by_symbol]
+        pos = np.searchsorted(closed_keys, lot_codes * scale + self.lot_ends, side='left')
+        found = pos < n
+        found[found] = codes[self._by_symbol[pos[found]]] == lot_codes[found]
+        close = np.where(found, self._by_symbol[np.minimum(pos, max(n - 1, 0))], n)
+        # Trades before the day after expiry; the lot is closed for later ones
+        expiry = self.expiries[lot_codes] if len(lot_codes) else np.array([], dtype='datetime64[ns]')
+        live_until = np.where(np.isnat(expiry), n,
+                              np.searchsorted(self.times, expiry + np.timedelta64(1, 'D'), side='left'))
+        last = np.minimum(close, live_until)
+
+        # Lots bucketed by the block of `block_size` trades that opened them and, within a
+        # block, latest last-open trade first; each is stored once, so memory stays linear
+        block = self.lot_trades // block_size
+        self._lot_order = np.lexsort((-last, block))
+        self._lot_keys = block[self._lot_order] * (n + 2) + (n - last[self._lot_order])
+        n_blocks = (n - 1) // block_size + 1 if n else 0
+        self._block_starts = np.searchsorted(block[self._lot_order], np.arange(n_blocks + 1), side='left')
+
+    def __len__(self):
+        return len(self.times)
+
+    def as_of(self, as_of_date):
+        """Open lots after the last trade at or before `as_of_date`: {symbol: [lot dicts]}."""
+        as_of_date = pd.Timestamp(as_of_date)
+        n = bisect_right(self._time_list, as_of_date.value)
+        if n == 0:
+            return {}
+        # Lots of every block up to the one holding trade n - 1 still open after trade n - 1
+        k = (n - 1) // self.block_size
+        starts = self._block_starts[:k + 1]
+        count = np.searchsorted(self._lot_keys, np.arange(k + 1) * (len(self) + 2) + len(self) - n,
+                                side='right') - starts
+        offsets = np.cumsum(count) - count
+        lots = np.sort(self._lot_order[np.repeat(starts, count) + np.arange(count.sum()) - np.repeat(offsets, count)])
+        lots = lots[self.lot_trades[lots] < n]
+
+        # Closed total of each lot's symbol after n trades: that of its last trade before n
+        trades = self.lot_trades[lots]
+        codes = self.codes[trades].astype(np.int64)
+        last = self._by_symbol[np.searchsorted(self._trade_keys, codes * (len(self) + 1) + n, side='left') - 1]
+        remaining = self.lot_ends[lots] - np.maximum(self.lot_starts[lots], self._closed[last])
+        expiry = self.expiries[codes]
+        live = (remaining > 0) & (np.isnat(expiry) | (expiry >= np.datetime64(as_of_date.normalize())))
+
+        # Symbols in first-traded order, lots oldest first
+        order = np.argsort(codes[live], kind='stable')
+        trades, codes, remaining = trades[live][order], codes[live][order], remaining[live][order]
+        positions = {}
+        for code, trade, quantity in zip(codes.tolist(), trades.tolist(), remaining.tolist()):
+            positions.setdefault(self.symbols[code], []).append({
+                'quantity': quantity,
+                'price': float(self.prices[trade]),
+                'execution_time': pd.Timestamp(self.times[trade]),
+            })
+        return positions
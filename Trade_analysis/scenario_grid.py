@@ -0,0 +1,158 @@
+import argparse
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from black_scholes import price, MIN_VOL, RISK_FREE_RATE
+from phase4_strategy_identification import STRATEGIES_FILE
+from phase5_mtm_calculation import strategy_legs
+from phase7_greeks import LOT_GREEKS_FILE
+
+# Default grid: underlying -10%..+10% in 0.5% steps, IV -10..+10 vol points
+SPOT_SHOCKS = np.round(np.arange(-10.0, 10.01, 0.5), 2)
+VOL_SHOCKS = np.arange(-10.0, 10.01, 2.5)
+
+# at_date is (strategy, spot shock, vol shock), at_expiry (strategy, spot shock); book_* are the whole book's
+ScenarioGrid = namedtuple('ScenarioGrid', ['date', 'days_forward', 'spot_shocks', 'vol_shocks', 'strategies',
+                                           'at_date', 'at_expiry', 'book_at_date', 'book_at_expiry',
+                                           'unpriced_lots'])
+
+
+def leg_grid(spot, strike, t, vol, is_call, qty, value, spot_shocks=SPOT_SHOCKS, vol_shocks=VOL_SHOCKS,
+             days_forward=0, rate=RISK_FREE_RATE):
+    """
+    P&L of each leg over a grid of underlying moves (percent) and IV shocks (vol
+    points), against its current per-unit `value`, as one broadcast computation.
+
+    Legs are valued by Black-Scholes `days_forward` calendar days ahead (legs expiring
+    before then at intrinsic value) and, separately, at their own expiry, where only
+    the underlying move matters. `qty` is signed (short legs negative) and `t` is in
+    years. Returns (at_date of shape (legs, spot shocks, vol shocks), at_expiry of
+    shape (legs, spot shocks)).
+    """
+    spot, strike, t, vol, qty, value = (np.asarray(a, dtype=float)[:, None, None]
+                                        for a in (spot, strike, t, vol, qty, value))
+    is_call = np.asarray(is_call, dtype=bool)[:, None, None]
+    shocked = spot * (1 + np.asarray(spot_shocks, dtype=float)[None, :, None] / 100.0)
+    shocked_vol = np.maximum(vol + np.asarray(vol_shocks, dtype=float)[None, None, :] / 100.0, MIN_VOL)
+
+    horizon = np.maximum(t - days_forward / 365.0, 0.0)
+    at_date = (price(shocked, strike, horizon, shocked_vol, is_call, rate) - value) * qty
+    intrinsic = np.where(is_call, np.maximum(shocked - strike, 0.0), np.maximum(strike - shocked, 0.0))
+    return at_date, ((intrinsic - value) * qty)[:, :, 0]
+
+
+def _on_date(df, date):
+    # Rows of `date`, converting only that day's slice when dates are still strings
+    dates = df['date'] if pd.api.types.is_datetime64_any_dtype(df['date']) else pd.to_datetime(df['date'])
+    return df[dates == date].assign(date=date)
+
+
+def open_lots(lot_greeks_df, date=None, underlying=None):
+    """Phase 7 lot-days of `date` (the latest by default), optionally of one underlying."""
+    date = pd.to_datetime(lot_greeks_df['date']).max() if date is None else pd.Timestamp(date)
+    lots = _on_date(lot_greeks_df, date)
+    if underlying is not None:
+        lots = lots[lots['underlying'] == underlying]
+    return lots.assign(expiry=pd.to_datetime(lots['expiry'])).reset_index(drop=True)
+
+
+def open_contracts(lot_greeks_df, date=None, underlying=None):
+    """
+    Lots of `date` netted per contract (symbol), which shares one close, spot and IV, with
+    strike as int and the summed signed position_qty. Lots without an IV, spot or close
+    are left out; returns (contracts, number of lots left out).
+    """
+    lots = open_lots(lot_greeks_df, date, underlying)
+    priced = lots['iv'].notna() & lots['spot'].notna() & lots['close'].notna()
+    lots = lots[priced]
+    contracts = lots.drop_duplicates('symbol').set_index('symbol')
+    contracts = contracts.assign(strike=np.trunc(pd.to_numeric(contracts['strike'])).astype(np.int64),
+                                 position_qty=lots.groupby('symbol')['position_qty'].sum())
+    return contracts, int((~priced).sum())
+
+
+def scenario_grid(lot_greeks_df, strategies, date=None, spot_shocks=SPOT_SHOCKS, vol_shocks=VOL_SHOCKS,
+                  days_forward=0, underlying=None, rate=RISK_FREE_RATE):
+    """
+    Scenario P&L of every strategy open on `date` (default: the last day of the book).
+
+    Lots come from Phase 7, at their close, spot and implied vol of that day; each
+    underlying is moved by the same percentage. Lots are netted per contract
+    (`open_contracts`) and each contract is gridded once. Contract grids are summed by
+    (strike, option_type) and attributed through the legs like Phases 5 to 7; the book
+    totals are summed over contracts, so a lot shared by two strategy rows counts
+    once. Lots without an IV are left out and counted in `unpriced_lots`.
+    Returns a ScenarioGrid.
+    """
+    spot_shocks = np.asarray(spot_shocks, dtype=float)
+    vol_shocks = np.asarray(vol_shocks, dtype=float)
+    date = pd.to_datetime(lot_greeks_df['date']).max() if date is None else pd.Timestamp(date)
+    contracts, unpriced = open_contracts(lot_greeks_df, date, underlying)
+
+    t = (contracts['expiry'] - date).dt.days.to_numpy() / 365.0
+    at_date, at_expiry = leg_grid(contracts['spot'], contracts['strike'], t, contracts['iv'],
+                                  (contracts['option_type'] == 'CE').to_numpy(), contracts['position_qty'],
+                                  contracts['close'], spot_shocks, vol_shocks, days_forward, rate)
+
+    # Contracts -> (strike, option_type) keys -> strategy rows, as incidence matrix products
+    keys = pd.MultiIndex.from_arrays([contracts['strike'], contracts['option_type']])
+    key_index = keys.unique()
+    key_of_contract = np.zeros((len(key_index), len(contracts)))
+    key_of_contract[key_index.get_indexer(keys), np.arange(len(contracts))] = 1.0
+
+    day = _on_date(strategies, date)
+    if underlying is not None:
+        day = day[day['underlying'] == underlying]
+    day = day.reset_index(drop=True)
+    legs = strategy_legs(day)
+    leg_keys = key_index.get_indexer(pd.MultiIndex.from_arrays([legs['strike'].astype(np.int64),
+                                                                legs['option_type']]))
+    found = leg_keys >= 0
+    key_of_strategy = np.zeros((len(day), len(key_index)))
+    np.add.at(key_of_strategy, (legs.index.to_numpy()[found], leg_keys[found]), 1.0)
+    attribution = key_of_strategy @ key_of_contract
+    by_strategy = np.tensordot(attribution, at_date, axes=1)
+    by_strategy_expiry = attribution @ at_expiry
+
+    return ScenarioGrid(date, days_forward, spot_shocks, vol_shocks,
+                        day[['strategy_id', 'strategy_type', 'legs']], by_strategy, by_strategy_expiry,
+                        at_date.sum(axis=0), at_expiry.sum(axis=0), unpriced)
+
+
+def scenario_frame(grid):
+    """Long table of a ScenarioGrid: one row per strategy (and 'BOOK') and spot and vol shock."""
+    ids = np.append(grid.strategies['strategy_id'].to_numpy(dtype=object), 'BOOK')
+    at_date = np.concatenate([grid.at_date, grid.book_at_date[None]])
+    at_expiry = np.concatenate([grid.at_expiry, grid.book_at_expiry[None]])
+    n_ids, n_spot, n_vol = at_date.shape
+    return pd.DataFrame({
+        'date': grid.date,
+        'strategy_id': np.repeat(ids, n_spot * n_vol),
+        'spot_shock_pct': np.tile(np.repeat(grid.spot_shocks, n_vol), n_ids),
+        'vol_shock_pts': np.tile(grid.vol_shocks, n_ids * n_spot),
+        'pnl_at_date': at_date.ravel().round(2),
+        'pnl_at_expiry': np.repeat(at_expiry.ravel(), n_vol).round(2),
+    })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='P&L of open strategies over underlying and IV shocks')
+    parser.add_argument('--date', default=None, help='Book date (default: the last day with open lots)')
+    parser.add_argument('--underlying', default=None)
+    parser.add_argument('--days-forward', type=int, default=0, help='Value the at-date grid this many days ahead')
+    parser.add_argument('--spot-shocks', type=float, nargs='+', default=SPOT_SHOCKS, help='Underlying moves, %%')
+    parser.add_argument('--vol-shocks', type=float, nargs='+', default=VOL_SHOCKS, help='IV shocks, vol points')
+    parser.add_argument('--output', default='scenario_grid.csv')
+    args = parser.parse_args()
+
+    grid = scenario_grid(pd.read_csv(LOT_GREEKS_FILE, parse_dates=['date', 'expiry']),
+                         pd.read_csv(STRATEGIES_FILE, parse_dates=['date']),
+                         args.date, args.spot_shocks, args.vol_shocks, args.days_forward, args.underlying)
+    scenario_frame(grid).to_csv(args.output, index=False)
+
+    print(f"Scenarios for {len(grid.strategies)} strategies on {grid.date:%Y-%m-%d} "
+          f"({grid.unpriced_lots} unpriced lots left out) saved to {args.output}")
+    print(pd.DataFrame(grid.book_at_date.round(0), index=grid.spot_shocks, columns=grid.vol_shocks)
+          .rename_axis(index='spot %', columns='vol pts').iloc[::4])
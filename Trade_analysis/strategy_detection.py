@@ -0,0 +1,346 @@
+from bisect import bisect_right
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+
+def make_strategy_id(date, underlying, expiry, strategy_type, legs):
+    legs_str = '|'.join([f"{s}_{t}_{np.sign(q)}" for s, t, q in legs])
+    return f"{date.strftime('%Y%m%d')}_{underlying}_{expiry}_{strategy_type}_{legs_str}"
+
+
+def _later(positions, i):
+    """Positions after i in an ascending index list."""
+    return positions[bisect_right(positions, i):]
+
+
+def _classify_spread(l1, l2):
+    strike1, option_type, qty1 = l1
+    strike2 = l2[0]
+    if option_type == 'CE':
+        # Bull Call: Long lower strike, Short higher strike
+        if strike1 < strike2 and qty1 > 0:
+            return 'Bull Call Spread'
+        elif strike1 > strike2 and qty1 < 0:
+            return 'Bull Call Spread'
+        return 'Bear Call Spread'
+    # Bull Put: Long higher strike, Short lower strike
+    if strike1 > strike2 and qty1 > 0:
+        return 'Bull Put Spread'
+    elif strike1 < strike2 and qty1 < 0:
+        return 'Bull Put Spread'
+    return 'Bear Put Spread'
+
+
+def _single_leg_type(option_type, qty):
+    if option_type == 'CE':
+        return 'Naked Call Buy' if qty > 0 else 'Naked Call Sell'
+    elif option_type == 'PE':
+        return 'Naked Put Buy' if qty > 0 else 'Naked Put Sell'
+    return 'Single Leg'
+
+
+def detect_group_strategies(option_types, strikes, quantities):
+    """
+    Greedy strategy detection for the legs of one (date, expiry, underlying) group.
+
+    Legs must be ordered by (option_type, strike). Each pass looks partners up in
+    hash indexes keyed by (option_type, quantity), (strike, quantity) or quantity,
+    visiting candidates in leg order, so the first match is the same one an
+    exhaustive scan over leg combinations would pick. Returns (strategy_type, legs)
+    pairs in detection order, legs as (strike, option_type, quantity) tuples.
+    """
+    n = len(option_types)
+    legs = list(zip(strikes, option_types, quantities))
+    used = [False] * n
+    found = []
+
+    by_type_qty = defaultdict(list)
+    by_strike_qty = defaultdict(list)
+    by_qty = defaultdict(list)
+    for i, (strike, option_type, qty) in enumerate(legs):
+        by_type_qty[(option_type, qty)].append(i)
+        by_strike_qty[(strike, qty)].append(i)
+        by_qty[qty].append(i)
+
+    def take(strategy_type, idxs):
+        for x in idxs:
+            used[x] = True
+        found.append((strategy_type, [legs[x] for x in idxs]))
+
+    # 1. Iron Condor: a call vertical plus a put vertical on four distinct strikes.
+    # Calls sort before puts, so the call pair is chosen first, then the first free put pair.
+    calls = [i for i in range(n) if option_types[i] == 'CE']
+    puts = [i for i in range(n) if option_types[i] == 'PE']
+
+    def first_put_pair(excluded):
+        for k in puts:
+            if used[k] or strikes[k] in excluded:
+                continue
+            for l in _later(by_type_qty[('PE', -quantities[k])], k):
+                if not used[l] and strikes[l] != strikes[k] and strikes[l] not in excluded:
+                    return k, l
+        return None
+
+    if len(calls) >= 2 and len(puts) >= 2:
+        for i in calls:
+            if used[i]:
+                continue
+            for j in _later(by_type_qty[('CE', -quantities[i])], i):
+                if used[j] or strikes[j] == strikes[i]:
+                    continue
+                put_pair = first_put_pair({strikes[i], strikes[j]})
+                if put_pair:
+                    take('Iron Condor', [i, j, *put_pair])
+                    break
+
+    # 2. Vertical Spreads (Bull/Bear Call/Put): same type, different strikes, opposite quantity
+    for i in range(n):
+        if used[i]:
+            continue
+        for j in _later(by_type_qty[(option_types[i], -quantities[i])], i):
+            if not used[j] and strikes[j] != strikes[i]:
+                take(_classify_spread(legs[i], legs[j]), [i, j])
+                break
+
+    # 3. Straddle: same strike, CE+PE, same quantity
+    for i in range(n):
+        if used[i]:
+            continue
+        for j in _later(by_strike_qty[(strikes[i], quantities[i])], i):
+            if not used[j] and option_types[j] != option_types[i]:
+                take('Straddle', [i, j])
+                break
+
+    # 4. Strangle: CE+PE, different strikes, same quantity
+    for i in range(n):
+        if used[i]:
+            continue
+        for j in _later(by_qty[quantities[i]], i):
+            if not used[j] and option_types[j] != option_types[i] and strikes[j] != strikes[i]:
+                take('Strangle', [i, j])
+                break
+
+    # 5. Single legs (unmatched) - classify as Naked Call/Put Buy/Sell
+    for i in range(n):
+        if not used[i]:
+            found.append((_single_leg_type(option_types[i], quantities[i]), [legs[i]]))
+
+    return found
+
+
+def detect_strategies(df):
+    """Detect strategies in one day's positions (phase 3 rows for a single date)."""
+    strategies = []
+    grouped = df[df['expiry'].notna() & df['underlying'].notna()]
+    ordered = grouped.sort_values(['expiry', 'underlying', 'option_type', 'strike'])
+
+    # Group by expiry, underlying
+    for (expiry, underlying), group in ordered.groupby(['expiry', 'underlying'], sort=False):
+        date = group['date'].iloc[0]
+        for strategy_type, strat_legs in detect_group_strategies(
+                group['option_type'].tolist(), group['strike'].tolist(), group['quantity'].tolist()):
+            strategies.append({
+                'date': date,
+                'underlying': underlying,
+                'expiry': expiry,
+                'strategy_type': strategy_type,
+                'legs': strat_legs,
+                'strategy_id': make_strategy_id(date, underlying, expiry, strategy_type, strat_legs)
+            })
+
+    strategies.extend(_calendar_spreads(df))
+    return strategies
+
+
+def _calendar_spreads(df):
+    """Calendar spreads per day: same underlying, strike, option_type and quantity across expiries."""
+    keys = ['date', 'underlying', 'strike', 'option_type', 'quantity']
+    # Distinct expiries of each leg key, in order of first appearance
+    legs = df[keys + ['expiry']].dropna(subset=keys).drop_duplicates()
+    # Keys held in two or more expiries, numbered in sorted key order
+    group = legs.groupby(keys, sort=True).ngroup().to_numpy()
+    spread = (np.bincount(group, weights=legs['expiry'].notna().to_numpy()) > 1)[group]
+    order = np.argsort(group[spread], kind='stable')
+    legs = legs[spread].iloc[order]
+
+    spreads = {}
+    for code, *key, expiry in zip(group[spread][order].tolist(), *(legs[col].tolist() for col in keys + ['expiry'])):
+        spreads.setdefault(code, (key, []))[1].append(expiry)
+
+    strategies = []
+    for (date, underlying, strike, option_type, quantity), exp_list in spreads.values():
+        strategies.append({
+            'date': date,
+            'underlying': underlying,
+            'expiry': '|'.join([str(e) for e in exp_list]),
+            'strategy_type': 'Calendar Spread',
+            'legs': [(strike, option_type, quantity, e) for e in exp_list],
+            'strategy_id': f"CAL_{underlying}_{strike}_{option_type}_{quantity}_" + "_".join([str(e) for e in exp_list])
+        })
+    return strategies
+
+
+def _detect_shard(type_codes, type_names, strikes, quantities, bounds):
+    """Process-pool task: detect strategies for consecutive groups given as flat arrays."""
+    option_types = np.asarray(type_names, dtype=object)[type_codes]
+    return [detect_group_strategies(option_types[start:end].tolist(), strikes[start:end].tolist(),
+                                    quantities[start:end].tolist())
+            for start, end in bounds]
+
+
+def detect_strategies_parallel(positions, workers, shards_per_worker=4):
+    """
+    Built-in detection for every day in `positions`, sharded over a process pool.
+
+    Days with identical open legs are detected once (as DayStrategyCache would) and
+    re-dated. The remaining (date, expiry, underlying) groups are sent to workers as
+    NumPy arrays in contiguous shards; results come back in submission order and
+    are merged day by day, so the output equals the serial per-day loop.
+    """
+    positions = positions.reset_index(drop=True)
+    grouped = positions[positions['expiry'].notna() & positions['underlying'].notna()]
+    ordered = grouped.sort_values(['date'] + DayStrategyCache.DETECTION_ORDER)
+    if ordered.empty:
+        # No legs to group, and calendars need an expiry and underlying too
+        return []
+    dates = ordered['date'].to_numpy()
+
+    # Fingerprint every day from one vectorized row hash
+    row_hashes = pd.util.hash_pandas_object(ordered[DayStrategyCache.FINGERPRINT_COLUMNS], index=False).to_numpy()
+    day_starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]])
+    day_ends = np.r_[day_starts[1:], len(ordered)]
+    representative = {}
+    day_source = []
+    for start, end in zip(day_starts, day_ends):
+        key = row_hashes[start:end].tobytes()
+        day_source.append(representative.setdefault(key, start))
+    detect_days = sorted(set(day_source))
+
+    # (date, expiry, underlying) groups of the days that need detection
+    group_keys = ordered[['date', 'expiry', 'underlying']].to_numpy()
+    new_group = np.r_[True, (group_keys[1:] != group_keys[:-1]).any(axis=1)]
+    group_starts = np.flatnonzero(new_group)
+    group_ends = np.r_[group_starts[1:], len(ordered)]
+    day_of_group = np.searchsorted(day_starts, group_starts, side='right') - 1
+    wanted = np.isin(day_starts[day_of_group], detect_days)
+    bounds = list(zip(group_starts[wanted].tolist(), group_ends[wanted].tolist()))
+
+    type_codes, type_names = pd.factorize(ordered['option_type'])
+    # Native dtype, so strikes format in legs and ids as the serial detector's do
+    strikes = ordered['strike'].to_numpy()
+    quantities = ordered['quantity'].to_numpy()
+    shards = [b.tolist() for b in np.array_split(np.array(bounds, dtype=np.int64).reshape(-1, 2),
+                                                 max(1, workers * shards_per_worker)) if len(b)]
+    tasks = [(type_codes[s[0][0]:s[-1][1]], list(type_names), strikes[s[0][0]:s[-1][1]],
+              quantities[s[0][0]:s[-1][1]], [(a - s[0][0], b - s[0][0]) for a, b in s]) for s in shards]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shard_results = list(pool.map(_detect_shard, *zip(*tasks))) if tasks else []
+
+    # Strategies per detected day, in group order, followed by that day's calendars
+    by_day = defaultdict(list)
+    expiries = ordered['expiry'].to_numpy(dtype=object)
+    underlyings = ordered['underlying'].to_numpy(dtype=object)
+    group_results = (result for shard in shard_results for result in shard)
+    for (start, _end), day, found in zip(bounds, day_starts[day_of_group[wanted]], group_results):
+        date, expiry, underlying = pd.Timestamp(dates[start]), expiries[start], underlyings[start]
+        for strategy_type, strat_legs in found:
+            by_day[day].append({
+                'date': date,
+                'underlying': underlying,
+                'expiry': expiry,
+                'strategy_type': strategy_type,
+                'legs': strat_legs,
+                'strategy_id': make_strategy_id(date, underlying, expiry, strategy_type, strat_legs)
+            })
+    detect_dates = set(dates[detect_days])
+    for strategy in _calendar_spreads(positions[positions['date'].isin(detect_dates)]):
+        by_day[day_starts[np.searchsorted(dates[day_starts], np.datetime64(strategy['date']))]].append(strategy)
+
+    all_strategies = []
+    for start, source in zip(day_starts, day_source):
+        date, source_date = pd.Timestamp(dates[start]), pd.Timestamp(dates[source])
+        all_strategies.extend(by_day[source] if source == start else
+                              [_redate(s, source_date, date) for s in by_day[source]])
+    return all_strategies
+
+
+class DayStrategyCache:
+    """
+    Memo layer over a per-day detector (detect_strategies or StrategyRecognizer.recognize).
+
+    Open legs rarely change between fills, so each day's positions are fingerprinted on
+    (underlying, expiry, strike, option_type, quantity) in detection order. A day whose
+    fingerprint was seen recently reuses those strategies, re-dated, instead of running
+    detection again. `detect_days` fingerprints a whole frame of days in one pass.
+    """
+    FINGERPRINT_COLUMNS = ['underlying', 'expiry', 'strike', 'option_type', 'quantity']
+    DETECTION_ORDER = ['expiry', 'underlying', 'option_type', 'strike']
+
+    def __init__(self, detect, maxsize=64):
+        self.detect = detect
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def fingerprint(self, day_df):
+        ordered = day_df.sort_values(self.DETECTION_ORDER)[self.FINGERPRINT_COLUMNS]
+        return pd.util.hash_pandas_object(ordered, index=False).to_numpy().tobytes()
+
+    def __call__(self, day_df):
+        date = day_df['date'].iloc[0]
+        key = self.fingerprint(day_df)
+        strategies = self._cached(date, key)
+        return self._store(date, key, self.detect(day_df)) if strategies is None else strategies
+
+    def detect_days(self, positions):
+        """
+        Strategies for every day in `positions`, in date order, as calling the cache day by
+        day would give. All days are fingerprinted up front from one sort and one row hash
+        over the whole frame; only the days missing from the cache are sliced out, in
+        their original row order, and detected.
+        """
+        positions = positions[positions['date'].notna()].reset_index(drop=True)
+        ordered = positions.sort_values(['date'] + self.DETECTION_ORDER, kind='stable')
+        row_hashes = pd.util.hash_pandas_object(ordered[self.FINGERPRINT_COLUMNS], index=False).to_numpy()
+        rows = ordered.index.to_numpy()
+        dates = ordered['date'].to_numpy()
+        day_starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]]) if len(dates) else np.zeros(0, dtype=int)
+        day_ends = np.r_[day_starts[1:], len(dates)]
+
+        all_strategies = []
+        for start, end in zip(day_starts.tolist(), day_ends.tolist()):
+            date, key = pd.Timestamp(dates[start]), row_hashes[start:end].tobytes()
+            strategies = self._cached(date, key)
+            if strategies is None:
+                strategies = self._store(date, key, self.detect(positions.iloc[np.sort(rows[start:end])]))
+            all_strategies.extend(strategies)
+        return all_strategies
+
+    def _cached(self, date, key):
+        # Strategies of a recent day with the same fingerprint re-dated to `date`, else None
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+        self.hits += 1
+        self._cache.move_to_end(key)
+        cached_date, strategies = cached
+        return [_redate(s, cached_date, date) for s in strategies]
+
+    def _store(self, date, key, strategies):
+        self.misses += 1
+        self._cache[key] = (date, strategies)
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return strategies
+
+
+def _redate(strategy, old_date, new_date):
+    old_prefix = old_date.strftime('%Y%m%d_')
+    sid = strategy['strategy_id']
+    if sid.startswith(old_prefix):
+        sid = new_date.strftime('%Y%m%d_') + sid[len(old_prefix):]
+    return dict(strategy, date=new_date, strategy_id=sid)
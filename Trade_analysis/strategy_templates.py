@@ -0,0 +1,254 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+import pandas as pd
+
+from strategy_detection import make_strategy_id
+
+# "Sell 2 Call (higher strike)", "Buy Option (long expiry, diff strike)", "Buy Stock"
+LEG_PATTERN = re.compile(r'^(Buy|Sell)\s+(?:(\d+)\s+)?(Call|Put|Option|Stock)\s*(?:\(([^)]*)\))?$')
+
+INSTRUMENTS = {'Call': ['CE'], 'Put': ['PE'], 'Option': ['CE', 'PE'], 'Stock': ['FUT']}
+
+# Relative strike levels; only their order within one template matters
+STRIKE_LEVELS = {
+    'lowest strike': 0, 'lower strike': 1, 'low-mid strike': 2, 'ATM': 3,
+    'high-mid strike': 4, 'higher strike': 5, 'highest strike': 6,
+}
+# OTM puts sit below the money, OTM calls above it
+OTM_LEVELS = {'PE': 2, 'CE': 4}
+EXPIRY_LEVELS = {'short expiry': 0, 'long expiry': 1}
+
+# One template leg: instrument, +1/-1, quantity ratio, strike rank, expiry rank.
+# A rank of None leaves that attribute unconstrained (stock legs, "diff strike").
+TemplateLeg = namedtuple('TemplateLeg', ['option_type', 'sign', 'ratio', 'strike_rank', 'expiry_rank'])
+Template = namedtuple('Template', ['name', 'legs', 'distinct_strikes', 'signature'])
+
+
+def _dense_ranks(levels):
+    order = sorted({level for level in levels if level is not None})
+    return [None if level is None else order.index(level) for level in levels]
+
+
+def _signature(legs):
+    return tuple(sorted((leg.option_type, leg.sign, leg.ratio,
+                         -1 if leg.strike_rank is None else leg.strike_rank,
+                         -1 if leg.expiry_rank is None else leg.expiry_rank) for leg in legs))
+
+
+def _parse_leg(name, text):
+    match = LEG_PATTERN.match(text.strip())
+    if not match:
+        raise ValueError(f"Cannot parse leg '{text}' of strategy '{name}'")
+    action, ratio, instrument, qualifiers = match.groups()
+    qualifiers = [q.strip() for q in qualifiers.split(',')] if qualifiers else []
+    for q in qualifiers:
+        if q not in STRIKE_LEVELS and q not in EXPIRY_LEVELS and q not in ('OTM', 'diff strike'):
+            raise ValueError(f"Unknown qualifier '{q}' in leg '{text}' of strategy '{name}'")
+    return action, int(ratio or 1), instrument, qualifiers
+
+
+def compile_templates(path='option_strategies_legs.csv'):
+    """
+    Compile the strategy table (one row per strategy, legs as text) into Templates.
+    'Option' legs expand into a call and a put variant. Templates are ordered by leg
+    count, largest first, so wider structures claim their legs before spreads do.
+    Raises ValueError if two strategy names compile to the same signature.
+    """
+    table = pd.read_csv(path)
+    leg_columns = [c for c in table.columns if c.lower().startswith('leg')]
+    templates = []
+    names_by_signature = {}
+
+    for _, row in table.iterrows():
+        name = row['Strategy'].strip()
+        parsed = [_parse_leg(name, row[c]) for c in leg_columns if pd.notna(row[c]) and str(row[c]).strip()]
+        has_option_leg = any(instrument == 'Option' for _a, _r, instrument, _q in parsed)
+        for variant in INSTRUMENTS['Option'] if has_option_leg else [None]:
+            option_types, strike_levels, expiry_levels = [], [], []
+            distinct = False
+            for action, ratio, instrument, qualifiers in parsed:
+                option_type = variant if instrument == 'Option' else INSTRUMENTS[instrument][0]
+                strike_level = next((STRIKE_LEVELS[q] for q in qualifiers if q in STRIKE_LEVELS), None)
+                if 'OTM' in qualifiers:
+                    strike_level = OTM_LEVELS[option_type]
+                if 'diff strike' in qualifiers:
+                    distinct = True
+                elif strike_level is None and option_type != 'FUT':
+                    # Unqualified option legs share one strike (calendars, single legs)
+                    strike_level = STRIKE_LEVELS['ATM']
+                option_types.append(option_type)
+                strike_levels.append(strike_level)
+                expiry_levels.append(next((EXPIRY_LEVELS[q] for q in qualifiers if q in EXPIRY_LEVELS),
+                                          None if option_type == 'FUT' else 0))
+
+            legs = [TemplateLeg(option_type, 1 if action == 'Buy' else -1, ratio, strike_rank, expiry_rank)
+                    for (action, ratio, _i, _q), option_type, strike_rank, expiry_rank
+                    in zip(parsed, option_types, _dense_ranks(strike_levels), _dense_ranks(expiry_levels))]
+            signature = _signature(legs)
+            if names_by_signature.setdefault(signature, name) != name:
+                raise ValueError(f"'{name}' has the same legs as '{names_by_signature[signature]}'")
+            templates.append(Template(name, legs, distinct, signature))
+
+    return sorted(templates, key=lambda t: -len(t.legs))
+
+
+def _compare(a, b):
+    return (a > b) - (a < b)
+
+
+class StrategyRecognizer:
+    """
+    Matches open legs against compiled strategy templates.
+
+    Templates are compiled once; `signatures` maps each canonical leg signature to its
+    strategy name. Matching walks the legs of each (date, underlying) group once per
+    template, finding the remaining legs of a template through a hash index on
+    (option_type, quantity) whose contracts are sorted by strike. The strike ranks of
+    the legs already chosen bound the next leg's strike, so its candidates are a
+    bisected slice of that list rather than every contract of the right type and size.
+    """
+
+    def __init__(self, path='option_strategies_legs.csv'):
+        self.templates = compile_templates(path)
+        self.signatures = {t.signature: t.name for t in self.templates}
+
+    def classify(self, legs):
+        """Name of the template matching (option_type, sign, ratio, strike_rank, expiry_rank) legs, if any."""
+        return self.signatures.get(_signature([TemplateLeg(*leg) for leg in legs]))
+
+    def recognize(self, df):
+        """Recognize strategies in one day's positions; same record layout as detect_strategies."""
+        df = df[df['underlying'].notna() & df['expiry'].notna()]
+        # Lots of the same contract are one leg; ratios are expressed on contract quantity
+        legs = (df.groupby(['date', 'underlying', 'expiry', 'option_type', 'strike'], sort=True)['quantity']
+                  .sum().reset_index())
+        legs = legs[legs['quantity'] != 0]
+
+        strategies = []
+        for (date, underlying), group in legs.groupby(['date', 'underlying'], sort=False):
+            contracts = list(zip(group['option_type'], group['strike'], group['quantity'], group['expiry']))
+            for name, matched in self._match_group(contracts):
+                expiries = sorted({contracts[i][3] for i in matched})
+                strat_legs = [(contracts[i][1], contracts[i][0], contracts[i][2]) for i in matched]
+                expiry = expiries[0] if len(expiries) == 1 else '|'.join(str(e) for e in expiries)
+                strategies.append({
+                    'date': date,
+                    'underlying': underlying,
+                    'expiry': expiry,
+                    'strategy_type': name,
+                    'legs': strat_legs if len(expiries) == 1 else
+                            [(contracts[i][1], contracts[i][0], contracts[i][2], contracts[i][3]) for i in matched],
+                    'strategy_id': make_strategy_id(date, underlying, expiry, name, strat_legs)
+                })
+        return strategies
+
+    def _match_group(self, contracts):
+        used = [False] * len(contracts)
+        by_type_qty = defaultdict(list)
+        for i, (option_type, strike, qty, _expiry) in enumerate(contracts):
+            by_type_qty[(option_type, qty)].append((strike, i))
+        # (strikes, contract indexes) per (option_type, quantity), in strike order
+        by_type_qty = {key: tuple(map(list, zip(*sorted(entries)))) for key, entries in by_type_qty.items()}
+
+        found = []
+        for template in self.templates:
+            anchor = template.legs[0]
+            for i, (option_type, _strike, qty, _expiry) in enumerate(contracts):
+                if used[i] or option_type != anchor.option_type or (qty > 0) != (anchor.sign > 0):
+                    continue
+                if abs(qty) % anchor.ratio:
+                    continue
+                matched = self._extend(template, contracts, by_type_qty, used, [i], abs(qty) // anchor.ratio)
+                if matched:
+                    for x in matched:
+                        used[x] = True
+                    found.append((template.name, matched))
+
+        for i in range(len(contracts)):
+            if not used[i]:
+                found.append(('Single Leg', [i]))
+        return found
+
+    def _extend(self, template, contracts, by_type_qty, used, chosen, unit):
+        """Depth-first fill of the next template leg; returns contract indexes or None."""
+        if len(chosen) == len(template.legs):
+            return chosen
+        leg = template.legs[len(chosen)]
+        windows = self._windows(template, contracts, by_type_qty, chosen, unit)
+        if windows is None:
+            return None
+        _strikes, indexes, lo, hi = windows[0]
+        # Candidates in contract order, so the first match is the one a full scan would find
+        for c in sorted(indexes[lo:hi]):
+            if used[c] or c in chosen:
+                continue
+            if all(self._consistent(template, leg, contracts[c], template.legs[k], contracts[p])
+                   for k, p in enumerate(chosen)):
+                matched = self._extend(template, contracts, by_type_qty, used, chosen + [c], unit)
+                if matched:
+                    return matched
+        return None
+
+    @staticmethod
+    def _windows(template, contracts, by_type_qty, chosen, unit):
+        """
+        Candidates of every leg still to fill, as [strikes, indexes, lo, hi] slices of its
+        strike-sorted (option_type, quantity) list. Strike ranks bound each leg by the
+        legs already chosen, then by the windows of the other legs still to fill, so a
+        partial match with no completion in strike order fails before it is extended.
+        Returns None when some leg has no candidate.
+        """
+        remaining = template.legs[len(chosen):]
+        windows = []
+        for leg in remaining:
+            strikes, indexes = by_type_qty.get((leg.option_type, leg.sign * leg.ratio * unit), ((), ()))
+            lo, hi = 0, len(strikes)
+            if leg.strike_rank is not None:
+                # Chosen legs ranked below (above) this one put its strike above (below) theirs
+                for k, p in enumerate(chosen):
+                    rank, strike = template.legs[k].strike_rank, contracts[p][1]
+                    if rank is None:
+                        continue
+                    if rank <= leg.strike_rank:
+                        lo = max(lo, (bisect_right if rank < leg.strike_rank else bisect_left)(strikes, strike))
+                    if rank >= leg.strike_rank:
+                        hi = min(hi, (bisect_left if rank > leg.strike_rank else bisect_right)(strikes, strike))
+            if lo >= hi:
+                return None
+            windows.append([strikes, indexes, lo, hi])
+
+        # Ranks order the legs' strikes in a chain: each leg lies above the lowest strike
+        # open to every leg ranked below it and below the highest open to those above
+        ranked = sorted(((leg.strike_rank, w) for leg, w in zip(remaining, windows) if leg.strike_rank is not None),
+                        key=lambda item: item[0])
+        for _ in range(len(ranked) - 1):
+            for i, (rank1, w1) in enumerate(ranked):
+                for rank2, w2 in ranked[i + 1:]:
+                    if rank1 < rank2:
+                        w2[2] = max(w2[2], bisect_right(w2[0], w1[0][w1[2]]))
+                        w1[3] = min(w1[3], bisect_left(w1[0], w2[0][w2[3] - 1]))
+                    else:
+                        # Equal ranks share one strike
+                        w2[2] = max(w2[2], bisect_left(w2[0], w1[0][w1[2]]))
+                        w2[3] = min(w2[3], bisect_right(w2[0], w1[0][w1[3] - 1]))
+                        if w2[2] >= w2[3]:
+                            return None
+                        w1[2] = max(w1[2], bisect_left(w1[0], w2[0][w2[2]]))
+                        w1[3] = min(w1[3], bisect_right(w1[0], w2[0][w2[3] - 1]))
+                    if w1[2] >= w1[3] or w2[2] >= w2[3]:
+                        return None
+        return windows
+
+    @staticmethod
+    def _consistent(template, leg, contract, other_leg, other):
+        """Whether two contracts sit in the strike/expiry order their template legs require."""
+        if leg.expiry_rank is not None and other_leg.expiry_rank is not None:
+            if _compare(contract[3], other[3]) != _compare(leg.expiry_rank, other_leg.expiry_rank):
+                return False
+        if template.distinct_strikes and contract[1] == other[1]:
+            return False
+        if leg.strike_rank is not None and other_leg.strike_rank is not None:
+            if _compare(contract[1], other[1]) != _compare(leg.strike_rank, other_leg.strike_rank):
+                return False
+        return True
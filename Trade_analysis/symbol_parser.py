@@ -0,0 +1,67 @@
+import re
+import pandas as pd
+
+# Monthly: NIFTY24APR22300CE
+MONTHLY_PATTERN = re.compile(r'^([A-Z]+)(\d{2})(JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)(\d+)(CE|PE)$')
+# Weekly: NIFTY2450522650PE or NIFTY24O312650PE
+WEEKLY_PATTERN = re.compile(r'^([A-Z]+)(\d{2})(\d|O|N|D)(\d{2})(\d+)(CE|PE)$')
+
+MONTH_MAP = {'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+             'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12,
+             'O': 10, 'N': 11, 'D': 12}
+MONTH_MAP.update({str(m): m for m in range(1, 10)})
+
+PARSED_COLUMNS = ['underlying', 'expiry_year', 'expiry_month', 'expiry_day',
+                  'strike', 'option_type', 'parsed_expiry_date']
+
+# Parsed fields per symbol; tradebooks repeat the same contracts thousands of times
+_symbol_cache = {}
+
+
+def _parse_unique(symbols):
+    """Parse an array of distinct symbols with compiled patterns, one pass per pattern."""
+    s = pd.Series(symbols, dtype=object)
+    monthly = s.str.extract(MONTHLY_PATTERN)
+    weekly = s.str.extract(WEEKLY_PATTERN)
+    is_monthly = monthly[0].notna()
+    is_weekly = ~is_monthly & weekly[0].notna()
+
+    underlying = monthly[0].where(is_monthly, weekly[0].where(is_weekly))
+    year = pd.to_numeric(monthly[1].where(is_monthly, weekly[1].where(is_weekly))) + 2000
+    month = monthly[2].where(is_monthly, weekly[2].where(is_weekly)).map(MONTH_MAP).astype(float)
+    day = pd.to_numeric(weekly[3].where(is_weekly))
+    strike = pd.to_numeric(monthly[3].where(is_monthly, weekly[4].where(is_weekly)))
+    option_type = monthly[4].where(is_monthly, weekly[5].where(is_weekly))
+
+    # Weekly symbols carry the full expiry date; monthly ones only the month
+    expiry_date = pd.to_datetime(
+        pd.DataFrame({'year': year.where(is_weekly), 'month': month.where(is_weekly), 'day': day}),
+        errors='coerce'
+    )
+    return list(zip(s, underlying, year, month, day, strike, option_type, expiry_date))
+
+
+def parse_symbols(symbols):
+    """
+    Vectorized equivalent of the row-wise NSE option symbol parser.
+    Each distinct symbol is parsed once and memoized, then broadcast back to every row.
+    Returns a DataFrame indexed like `symbols` with PARSED_COLUMNS.
+    """
+    codes, uniques = pd.factorize(symbols)
+    missing = [sym for sym in uniques if sym not in _symbol_cache]
+    if missing:
+        for sym, *fields in _parse_unique(missing):
+            _symbol_cache[sym] = tuple(fields)
+
+    parsed = pd.DataFrame([_symbol_cache[sym] for sym in uniques], columns=PARSED_COLUMNS)
+    parsed = parsed.astype({'expiry_year': float, 'expiry_month': float, 'expiry_day': float,
+                            'strike': float, 'parsed_expiry_date': 'datetime64[ns]'})
+    # Missing symbols get code -1, which reindexes to an all-NaN row
+    result = parsed.reindex(codes)
+    result.index = symbols.index
+    return result
+
+
+def clear_symbol_cache():
+    """Drop memoized symbols, e.g. between unrelated tradebooks in a long-running process."""
+    _symbol_cache.clear()
@@ -0,0 +1,211 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from expiry_calendar import build_expiry_calendar, NSE_HOLIDAYS
+
+TRADEBOOK_COLUMNS = ['symbol', 'isin', 'trade_date', 'exchange', 'segment', 'series', 'trade_type', 'auction',
+                     'quantity', 'price', 'trade_id', 'order_id', 'order_execution_time', 'expiry_date']
+
+# underlying: (share of positions, starting spot, strike step, lot size)
+UNDERLYINGS = {
+    'NIFTY': (0.7, 22000.0, 50, 50),
+    'BANKNIFTY': (0.3, 48000.0, 100, 15),
+}
+
+# Position shapes as (strike offset in steps, option type, side): every leg of a shape is
+# entered and exited together, so phase 4 sees naked legs, spreads, straddles, strangles
+# and iron condors
+SHAPES = [
+    ([(0, 'CE', 1)], 0.2),
+    ([(0, 'PE', 1)], 0.2),
+    ([(0, 'CE', 1), (4, 'CE', -1)], 0.15),
+    ([(0, 'PE', 1), (-4, 'PE', -1)], 0.15),
+    ([(0, 'CE', -1), (0, 'PE', -1)], 0.1),
+    ([(4, 'CE', -1), (-4, 'PE', -1)], 0.1),
+    ([(2, 'CE', -1), (6, 'CE', 1), (-2, 'PE', -1), (-6, 'PE', 1)], 0.1),
+]
+
+WEEKLY_MONTH_CODES = np.array(['', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'O', 'N', 'D'])
+MONTH_NAMES = np.array(['', 'JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC'])
+
+MARKET_OPEN = np.timedelta64(9 * 3600 + 15 * 60, 's')
+SESSION_SECONDS = 6 * 3600 + 15 * 60
+
+
+def _expiries(underlying, start_year, end_year):
+    """Sorted expiry dates of an underlying and whether each is the monthly contract."""
+    calendar = build_expiry_calendar(start_year, end_year)
+    calendar = calendar[calendar['underlying'] == underlying]
+    monthly = set(calendar.loc[calendar['kind'] == 'monthly', 'expiry_date'])
+    dates = np.sort(calendar['expiry_date'].unique())
+    return dates.astype('datetime64[D]'), np.isin(dates, list(monthly))
+
+
+def _symbols(underlying, expiry, is_monthly, strike, option_type):
+    """Zerodha F&O symbols: NIFTY24APR22300CE for monthly contracts, NIFTY2450222450PE for weeklies."""
+    expiry = pd.DatetimeIndex(expiry)
+    year = pd.Series(expiry.year % 100).astype(str).str.zfill(2).to_numpy()
+    month, day = expiry.month.to_numpy(), expiry.day.to_numpy()
+    code = np.where(is_monthly, MONTH_NAMES[month],
+                    WEEKLY_MONTH_CODES[month] + pd.Series(day).astype(str).str.zfill(2).to_numpy())
+    return pd.Series(underlying, dtype=object) + year + code + strike.astype(str) + option_type
+
+
+def _format_days(days, fmt):
+    # strftime is slow per row; tradebooks span a few hundred distinct days
+    uniques, inverse = np.unique(days.astype('datetime64[D]'), return_inverse=True)
+    return pd.DatetimeIndex(uniques).strftime(fmt).to_numpy()[inverse]
+
+
+def generate_tradebook(fills, seed=0, start='2024-04-01', days=250, monthly_share=0.3, expire_share=0.25):
+    """
+    Deterministic synthetic Zerodha F&O tradebook with exactly `fills` rows, in the
+    columns of the downloaded CSV.
+
+    Positions open on one of `days` NSE trading days from `start`, in NIFTY or
+    BANKNIFTY weekly contracts (the monthly one for `monthly_share` of them), with
+    strikes around a random-walk spot. Each position is a shape from SHAPES, closed in
+    up to three partial exits before expiry; `expire_share` of them leave the last
+    part (or all of it) to expire. The same `seed` always yields the same tradebook.
+    """
+    rng = np.random.default_rng(seed)
+    holidays = np.array(NSE_HOLIDAYS, dtype='datetime64[D]')
+    first_day = np.busday_offset(np.datetime64(pd.Timestamp(start).date()), 0, roll='forward', holidays=holidays)
+    trading_days = np.busday_offset(first_day, np.arange(days), holidays=holidays)
+    end_year = int(str(trading_days[-1])[:4]) + 1
+
+    shape_legs = [legs for legs, _ in SHAPES]
+    shape_weights = np.array([weight for _, weight in SHAPES])
+    # Rows per position: legs x (entry + about 1.3 exits), padded so one draw is enough
+    mean_rows = (np.array([len(legs) for legs in shape_legs]) * shape_weights).sum() * 2
+    n = int(fills / mean_rows * 1.2) + 16
+
+    # --- Positions ---
+    names = list(UNDERLYINGS)
+    underlying_code = rng.choice(len(names), size=n, p=[UNDERLYINGS[name][0] for name in names])
+    entry_day_ix = rng.integers(0, days, size=n)
+    entry_day = trading_days[entry_day_ix]
+    entry_time = entry_day.astype('datetime64[s]') + MARKET_OPEN + rng.integers(0, SESSION_SECONDS - 600, size=n)
+    shape = rng.choice(len(SHAPES), size=n, p=shape_weights)
+    lots = rng.integers(1, 11, size=n)
+    exits = np.minimum(rng.integers(0, 4, size=n), lots)
+    expire_rest = (rng.random(size=n) < expire_share) & (exits > 0)
+    want_monthly = rng.random(size=n) < monthly_share
+
+    expiry = np.empty(n, dtype='datetime64[D]')
+    is_monthly = np.zeros(n, dtype=bool)
+    atm = np.zeros(n, dtype=np.int64)
+    lot_size = np.zeros(n, dtype=np.int64)
+    step = np.zeros(n, dtype=np.int64)
+    for code, name in enumerate(names):
+        mask = underlying_code == code
+        _, spot0, strike_step, size = UNDERLYINGS[name]
+        dates, monthly = _expiries(name, int(str(first_day)[:4]), end_year)
+        # Nearest expiry on or after entry, or the nearest monthly one
+        nearest = np.searchsorted(dates, entry_day[mask])
+        monthly_dates = dates[monthly]
+        nearest_monthly = np.searchsorted(dates, monthly_dates[np.searchsorted(monthly_dates, entry_day[mask])])
+        pick = np.where(want_monthly[mask], nearest_monthly, nearest)
+        expiry[mask] = dates[pick]
+        is_monthly[mask] = monthly[pick]
+        spot = spot0 * np.exp(np.cumsum(rng.normal(0, 0.009, size=days)))
+        atm[mask] = np.round(spot[entry_day_ix[mask]] / strike_step).astype(np.int64) * strike_step
+        lot_size[mask] = size
+        step[mask] = strike_step
+
+    # --- Legs: one row per position leg ---
+    legs_per = np.array([len(shape_legs[s]) for s in shape])
+    pos = np.repeat(np.arange(n), legs_per)
+    leg_ix = np.arange(len(pos)) - np.repeat(np.cumsum(legs_per) - legs_per, legs_per)
+    flat = [leg for legs in shape_legs for leg in legs]
+    flat_start = np.cumsum([0] + [len(legs) for legs in shape_legs])[:-1]
+    leg_row = flat_start[shape[pos]] + leg_ix
+    offset = np.array([leg[0] for leg in flat])[leg_row]
+    leg_type = np.array([leg[1] for leg in flat])[leg_row]
+    # Half the positions take the other side of their shape
+    side = np.array([leg[2] for leg in flat])[leg_row] * np.where(rng.random(size=n) < 0.5, 1, -1)[pos]
+    strike = atm[pos] + offset * step[pos]
+    entry_price = np.maximum(np.round(rng.lognormal(np.log(120), 0.8, size=len(pos)) * 20) / 20, 0.05)
+
+    # --- Fills: entry plus exits per leg, exits sharing the position's schedule ---
+    exit_count = exits - expire_rest
+    fills_per = 1 + exit_count[pos]
+    row_leg = np.repeat(np.arange(len(pos)), fills_per)
+    seq = np.arange(len(row_leg)) - np.repeat(np.cumsum(fills_per) - fills_per, fills_per)
+    row_leg, seq = row_leg[:fills], seq[:fills]
+    if len(row_leg) < fills:
+        raise RuntimeError(f"Generated {len(row_leg)} fills, fewer than the {fills} requested")
+    row_pos = pos[row_leg]
+
+    # Partial exits split the lots evenly, the last exit taking the remainder
+    part_lots = lots[row_pos] // np.maximum(exits[row_pos], 1)
+    last_part = seq == exits[row_pos]
+    part_lots = np.where(last_part, lots[row_pos] - part_lots * (exits[row_pos] - 1), part_lots)
+    row_lots = np.where(seq == 0, lots[row_pos], part_lots)
+
+    # Exit schedule per position, shared by its legs: sorted moments between entry and the
+    # expiry close, measured in trading sessions so every exit lands inside market hours
+    exit_pos = np.repeat(np.arange(n), exit_count)
+    sessions = np.busday_count(entry_day, expiry + 1, holidays=holidays)
+    entry_frac = (entry_time - entry_day.astype('datetime64[s]') - MARKET_OPEN).astype(np.int64) / SESSION_SECONDS
+    u = rng.random(size=len(exit_pos))
+    u = u[np.lexsort((u, exit_pos))]
+    x = entry_frac[exit_pos] + u * (sessions[exit_pos] - entry_frac[exit_pos])
+    session_ix = np.floor(x).astype(np.int64)
+    exit_time = (np.busday_offset(entry_day[exit_pos], session_ix, holidays=holidays).astype('datetime64[s]')
+                 + MARKET_OPEN + ((x - session_ix) * SESSION_SECONDS).astype(np.int64))
+    schedule_start = np.cumsum(exit_count) - exit_count
+    times = entry_time[row_pos]
+    is_exit = seq > 0
+    times[is_exit] = exit_time[schedule_start[row_pos[is_exit]] + seq[is_exit] - 1]
+
+    row_side = np.where(~is_exit, side[row_leg], -side[row_leg])
+    move = np.exp(rng.normal(0, 0.4, size=len(row_leg)))
+    price = np.where(~is_exit, entry_price[row_leg],
+                     np.maximum(np.round(entry_price[row_leg] * move * 20) / 20, 0.05))
+
+    # Symbols are built once per contract and broadcast to its fills
+    contract = (((underlying_code[row_pos] * 100_000 + expiry[row_pos].astype(np.int64)) * 1_000_000
+                 + strike[row_leg]) * 2 + (leg_type[row_leg] == 'PE'))
+    contracts, first, inverse = np.unique(contract, return_index=True, return_inverse=True)
+    first_pos, first_leg = row_pos[first], row_leg[first]
+    symbols = _symbols(np.array(names)[underlying_code[first_pos]], expiry[first_pos], is_monthly[first_pos],
+                       strike[first_leg], leg_type[first_leg]).to_numpy()
+
+    book = pd.DataFrame({
+        'symbol': symbols[inverse],
+        'isin': np.nan,
+        'trade_date': _format_days(times, '%d-%m-%Y'),
+        'exchange': 'NSE',
+        'segment': 'FO',
+        'series': np.nan,
+        'trade_type': np.where(row_side > 0, 'buy', 'sell'),
+        'auction': 'FALSE',
+        'quantity': row_lots * lot_size[row_pos],
+        'price': price,
+        'execution': times,
+        'expiry_date': _format_days(expiry[row_pos], '%d-%m-%Y'),
+    })
+    book = book.sort_values('execution', kind='stable').reset_index(drop=True)
+    book['trade_id'] = 70_000_000 + np.arange(len(book))
+    book['order_id'] = 1_100_000_000_000_000 + np.arange(len(book)) * 7
+    book['order_execution_time'] = np.datetime_as_string(book['execution'].to_numpy().astype('datetime64[s]'))
+    return book[TRADEBOOK_COLUMNS]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a deterministic synthetic Zerodha F&O tradebook')
+    parser.add_argument('--fills', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', default='2024-04-01', help='First trading day')
+    parser.add_argument('--days', type=int, default=250, help='Trading days positions are opened on')
+    parser.add_argument('--output', default=None, help='CSV path (default synthetic_tradebook_<fills>.csv)')
+    args = parser.parse_args()
+
+    book = generate_tradebook(args.fills, seed=args.seed, start=args.start, days=args.days)
+    output = args.output or f'synthetic_tradebook_{args.fills}.csv'
+    book.to_csv(output, index=False)
+    print(f"Wrote {len(book)} fills over {book['symbol'].nunique()} contracts to {output}")
+    print(book.head())
@@ -0,0 +1,46 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import date
+
+
+class ScenarioLeg(BaseModel):
+    """An option leg to put through the scenario grid"""
+    spot: float = Field(..., gt=0, description="Current underlying price")
+    strike: float = Field(..., gt=0)
+    option_type: str = Field(..., description="CE or PE")
+    expiry: date
+    quantity: float = Field(..., description="Signed quantity, negative for short legs")
+    price: float = Field(..., ge=0, description="Current option premium")
+    iv: Optional[float] = Field(None, gt=0, description="Implied vol in percent; solved from price if omitted")
+
+
+class ScenarioRequest(BaseModel):
+    """Legs and shocks for a payoff grid"""
+    legs: List[ScenarioLeg]
+    as_of: Optional[date] = None
+    days_forward: int = Field(0, ge=0)
+    spot_shocks: Optional[List[float]] = Field(None, description="Underlying moves in percent")
+    vol_shocks: Optional[List[float]] = Field(None, description="IV shocks in vol points")
+
+
+class ScenarioGridResponse(BaseModel):
+    """P&L over spot shocks (rows) and vol shocks (columns), plus the payoff at expiry"""
+    as_of: date
+    days_forward: int
+    spot_shocks: List[float]
+    vol_shocks: List[float]
+    pnl_at_date: List[List[float]]
+    pnl_at_expiry: List[float]
+
+
+class StrategyScenario(BaseModel):
+    strategy_id: str
+    strategy_type: str
+    pnl_at_date: List[List[float]]
+    pnl_at_expiry: List[float]
+
+
+class BookScenarioResponse(ScenarioGridResponse):
+    """Scenario grid of the whole book on a day, with each open strategy's grid"""
+    unpriced_lots: int
+    strategies: List[StrategyScenario]
@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Optional
+from datetime import date
+import os
+import sys
+import numpy as np
+import pandas as pd
+from app.models.scenario import ScenarioRequest, ScenarioGridResponse, BookScenarioResponse
+from app.routers.auth_router import get_current_user, User
+
+# The scenario engine lives with the trade analysis scripts, which import each other as top-level modules
+TRADE_ANALYSIS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                  "Trade_analysis")
+if TRADE_ANALYSIS_DIR not in sys.path:
+    sys.path.insert(0, TRADE_ANALYSIS_DIR)
+
+from black_scholes import implied_vol
+from phase4_strategy_identification import STRATEGIES_FILE as STRATEGIES_NAME
+from phase7_greeks import LOT_GREEKS_FILE as LOT_GREEKS_NAME
+from scenario_grid import SPOT_SHOCKS, VOL_SHOCKS, leg_grid, scenario_grid
+
+router = APIRouter(
+    prefix="/api/scenarios",
+    tags=["scenarios"],
+    responses={404: {"description": "Not found"}},
+)
+
+# Written by `pipeline.py --mtm --greeks` run from Trade_analysis
+LOT_GREEKS_FILE = os.path.join(TRADE_ANALYSIS_DIR, LOT_GREEKS_NAME)
+STRATEGIES_FILE = os.path.join(TRADE_ANALYSIS_DIR, STRATEGIES_NAME)
+
+# Pipeline outputs by path, reloaded when the file changes
+_loaded = {}
+
+def _load(path: str, parse_dates: List[str]) -> pd.DataFrame:
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{os.path.basename(path)} not found; run pipeline.py --mtm --greeks in Trade_analysis first"
+        )
+    mtime = os.path.getmtime(path)
+    if path not in _loaded or _loaded[path][0] != mtime:
+        _loaded[path] = (mtime, pd.read_csv(path, parse_dates=parse_dates))
+    return _loaded[path][1]
+
+def _shocks(values: Optional[List[float]], default: np.ndarray) -> np.ndarray:
+    return default if not values else np.asarray(values, dtype=float)
+
+# Routes
+@router.post("/grid", response_model=ScenarioGridResponse)
+async def leg_scenarios(request: ScenarioRequest, current_user: User = Depends(get_current_user)):
+    """P&L of a set of legs over underlying and IV shocks, on a day and at expiry"""
+    if not request.legs:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="At least one leg is required")
+    as_of = request.as_of or date.today()
+    legs = pd.DataFrame([leg.dict() for leg in request.legs])
+    legs["option_type"] = legs["option_type"].str.upper()
+    if not legs["option_type"].isin(["CE", "PE"]).all():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="option_type must be CE or PE")
+
+    t = (pd.to_datetime(legs["expiry"]) - pd.Timestamp(as_of)).dt.days.to_numpy() / 365.0
+    if (t <= 0).any():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Every leg must expire after as_of")
+    is_call = (legs["option_type"] == "CE").to_numpy()
+    iv = legs["iv"].to_numpy(dtype=float) / 100.0
+    missing = np.isnan(iv)
+    if missing.any():
+        iv[missing] = implied_vol(legs["price"].to_numpy(dtype=float), legs["spot"].to_numpy(dtype=float),
+                                  legs["strike"].to_numpy(dtype=float), t, is_call)[missing]
+    if np.isnan(iv).any():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No implied vol fits the price of legs " + ", ".join(map(str, np.flatnonzero(np.isnan(iv))))
+        )
+
+    spot_shocks = _shocks(request.spot_shocks, SPOT_SHOCKS)
+    vol_shocks = _shocks(request.vol_shocks, VOL_SHOCKS)
+    at_date, at_expiry = leg_grid(legs["spot"], legs["strike"], t, iv, is_call, legs["quantity"], legs["price"],
+                                  spot_shocks, vol_shocks, request.days_forward)
+    return {
+        "as_of": as_of,
+        "days_forward": request.days_forward,
+        "spot_shocks": spot_shocks.tolist(),
+        "vol_shocks": vol_shocks.tolist(),
+        "pnl_at_date": at_date.sum(axis=0).round(2).tolist(),
+        "pnl_at_expiry": at_expiry.sum(axis=0).round(2).tolist(),
+    }
+
+@router.get("/book", response_model=BookScenarioResponse)
+async def book_scenarios(
+    as_of: Optional[date] = Query(None, description="Book date; defaults to the last day with open lots"),
+    underlying: Optional[str] = Query(None),
+    days_forward: int = Query(0, ge=0),
+    spot_shocks: Optional[List[float]] = Query(None, description="Underlying moves in percent"),
+    vol_shocks: Optional[List[float]] = Query(None, description="IV shocks in vol points"),
+    current_user: User = Depends(get_current_user)
+):
+    """Scenario grid of every strategy open on a day, from the pipeline's Phase 7 output"""
+    lot_greeks = _load(LOT_GREEKS_FILE, ["date", "expiry"])
+    strategies = _load(STRATEGIES_FILE, ["date"])
+    grid = scenario_grid(lot_greeks, strategies, as_of, _shocks(spot_shocks, SPOT_SHOCKS),
+                         _shocks(vol_shocks, VOL_SHOCKS), days_forward, underlying)
+    if pd.isna(grid.date) or grid.strategies.empty:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No open positions on that day")
+
+    return {
+        "as_of": grid.date.date(),
+        "days_forward": days_forward,
+        "spot_shocks": grid.spot_shocks.tolist(),
+        "vol_shocks": grid.vol_shocks.tolist(),
+        "pnl_at_date": grid.book_at_date.round(2).tolist(),
+        "pnl_at_expiry": grid.book_at_expiry.round(2).tolist(),
+        "unpriced_lots": grid.unpriced_lots,
+        "strategies": [
+            {
+                "strategy_id": row.strategy_id,
+                "strategy_type": row.strategy_type,
+                "pnl_at_date": grid.at_date[i].round(2).tolist(),
+                "pnl_at_expiry": grid.at_expiry[i].round(2).tolist(),
+            }
+            for i, row in enumerate(grid.strategies.itertuples(index=False))
+        ],
+    }
@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse, FileResponse
-from app.routers import nav_router, auth_router, zerodha_router, market_router
+from app.routers import nav_router, auth_router, zerodha_router, market_router, scenario_router
 import os
 
 app = FastAPI(
@@ -27,6 +27,7 @@ app.include_router(nav_router.router)
 app.include_router(auth_router.router)
 app.include_router(zerodha_router.router)
 app.include_router(market_router.router)
+app.include_router(scenario_router.router)
 
 @app.get("/")
 def read_root():